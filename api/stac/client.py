@@ -4,8 +4,10 @@ import logging
 import asyncio
 import re
 from typing import Dict, Any, List, Optional
+from sqlmodel import col, select
 
-from .crud import engine, Session
+from . import serialization
+from .crud import Session, session_factory
 from .models import (
     Collection,
     Keyword,
@@ -113,7 +115,7 @@ class StacClient(httpx.Client):
     ):
         """Fetch a collection from a URL."""
         response = self._make_request("GET", collection_url)
-        data = response.json()
+        data = serialization.loads(response.content)
 
         collection = Collection.from_response(data)
 
@@ -122,7 +124,8 @@ class StacClient(httpx.Client):
         _links = [link for link in _links if link["rel"] != "self"]
 
         keywords = [
-            Keyword(keyword=keyword, collection=collection) for keyword in _keywords
+            Keyword(keyword=keyword, collection=collection)
+            for keyword in dict.fromkeys(_keywords)
         ]
         links = [
             CollectionLink(
@@ -148,19 +151,13 @@ class StacClient(httpx.Client):
     ):
         """Fetch input parameters for a collection from a URL."""
         response = self._make_request("GET", retrieve_url)
-        data = response.json()
+        data = serialization.loads(response.content)
         logger.info(
             f"Fetching input parameters for collection {collection.collection_id}"
         )
         logger.info(f"Data: {data}")
 
-        input_schema = InputSchema.create_with_parameters(data, collection)
-
-        if session:
-            session.add(input_schema)
-            session.add_all(input_schema.parameters)
-
-        return input_schema
+        return InputSchema.create_with_parameters(data, collection, session)
 
     def estimate_request_cost(self, collection_id: str, request_data: Dict[str, Any]):
         """Estimate the cost of a request."""
@@ -171,7 +168,7 @@ class StacClient(httpx.Client):
 
             response = self._make_request("POST", url, json=payload)
             response.raise_for_status()
-            data = response.json()
+            data = serialization.loads(response.content)
 
             return data
 
@@ -184,7 +181,7 @@ class StacClient(httpx.Client):
     ) -> List[CatalogLink]:
         """Get basic information about a collection."""
         response = self._make_request("GET", self.catalogue_url)
-        data = response.json()
+        data = serialization.loads(response.content)
         links = data.get("links", [])
         seen_links = set()
         catalog_links = []
@@ -215,7 +212,7 @@ class StacClient(httpx.Client):
         """Get all collections."""
         entities = []
         children_links = [link for link in catalog_links if link.rel == "child"]
-        if limit:
+        if limit is not None:
             children_links = children_links[:limit]
         for link in children_links:
             collection = self.fetch_collection_from_url(link.collection_url, session)
@@ -236,7 +233,7 @@ class StacClient(httpx.Client):
         try:
             response = self.get(url)
             response.raise_for_status()
-            data = response.json()
+            data = serialization.loads(response.content)
             return data.get("collections", [])
 
         except httpx.HTTPStatusError as e:
@@ -252,7 +249,7 @@ class StacClient(httpx.Client):
 
             response = self.post(url, json=payload)
             response.raise_for_status()
-            data = response.json()
+            data = serialization.loads(response.content)
             return data.get("features", [])
 
         except httpx.HTTPStatusError as e:
@@ -288,7 +285,7 @@ class AsyncStacClient(httpx.AsyncClient):
 
     async def fetch_catalog_links(self) -> List[Dict[str, Any]]:
         response = await self.get(self.catalogue_url, timeout=self.timeout)
-        data = response.json()
+        data = serialization.loads(response.content)
         links = data.get("links", [])
         self._catalog_links = links
         return links
@@ -312,12 +309,12 @@ class AsyncStacClient(httpx.AsyncClient):
         response: httpx.Response = await self.get(
             collection_url, timeout=config.timeout
         )
-        data: Dict[str, Any] = response.json()
+        data: Dict[str, Any] = serialization.loads(response.content)
         return StacCollection.from_response(data)
 
     async def fetch_collection_inputs_from_id(self, collection_id: str) -> StacRetrieve:
         response: httpx.Response = await self.get(self.retrieve_url(collection_id))
-        data: Dict[str, Any] = response.json()
+        data: Dict[str, Any] = serialization.loads(response.content)
         return StacRetrieve.from_response(data)
 
     async def fetch_all_collections(self):
@@ -346,19 +343,26 @@ class AsyncStacClient(httpx.AsyncClient):
         return collections
 
     def persist_all(self, collections: List[StacCollection]):
-        # TODO: add keyword and collection_link inserts
-        entities = []
-        with Session(engine, expire_on_commit=False) as session:
-            for collection_data in collections:
-                collection = Collection.from_stac_collection(collection_data)
-                entities.append(collection)
-                if collection_data.retrieve_inputs:
-                    input_schema = InputSchema.create_with_parameters(
-                        collection_data.retrieve_inputs, collection
+        """Upsert the collections, so that loading the catalog again refreshes them.
+
+        Input schemas are only created for the collections without one yet.
+        """
+        with session_factory() as session:
+            stored = Collection.bulk_upsert(session, collections)
+            with_schema = set(
+                session.exec(
+                    select(InputSchema.collection_id).where(
+                        col(InputSchema.collection_id).in_(
+                            [collection.id for collection in stored]
+                        )
+                    )
+                ).all()
+            )
+            for collection, collection_data in zip(stored, collections):
+                if collection_data.retrieve_inputs and collection.id not in with_schema:
+                    InputSchema.create_with_parameters(
+                        collection_data.retrieve_inputs, collection, session
                     )
-                    entities.append(input_schema)
-
-            session.add_all(entities)
             session.commit()
 
 
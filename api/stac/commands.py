@@ -5,8 +5,8 @@ import asyncio
 from rich.console import Console
 from typing import List
 
-from api.stac.client import async_stac_client, init_all_collections
-from api.stac.crud import engine, Session, list_items
+from api.stac.client import init_all_collections
+from api.stac.crud import session_factory, list_items
 from api.stac.models import Tables
 from api.stac.config import OutputFormat
 
@@ -29,7 +29,6 @@ def init(
     if progress:
         logger.warning("Progress is not implemented yet")
     collections = asyncio.run(init_all_collections())
-    async_stac_client.persist_all(collections)
     console.print(f"Initialized {len(collections)} collections")
     
 @app.command(
@@ -44,7 +43,7 @@ def list(
 ):
     if filter_string:
         table_filter = table.validate_filter_string(filter_string[0])
-        with Session(engine) as session:
+        with session_factory() as session:
             items = table.apply_filter(table_filter, session)
     else:
         items = list_items(table, limit)
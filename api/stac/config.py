@@ -93,6 +93,10 @@ class STACConfig(BaseSettings):
         default=400.0, ge=0,
         description="Default budget limit for templates"
     )
+    max_cost_estimate: float = Field(
+        default=1e12, gt=1,
+        description="Local cost estimates above this are reported as invalid"
+    )
     optimization_cache_size: int = Field(
         default=1000, ge=10, le=10000,
         description="Optimization results cache size"
@@ -1,13 +1,43 @@
 import os
+import sys
 import json
+import atexit
+import hashlib
 import logging
 import httpx
-import polars as pl
 
-from math import prod
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import cached_property, lru_cache, wraps
+from math import exp, log, prod
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
+from sqlalchemy import (
+    UniqueConstraint,
+    bindparam,
+    delete,
+    event,
+    exists,
+    lambda_stmt,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import selectinload, sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.sql.lambdas import StatementLambdaElement
 from sqlmodel import SQLModel, create_engine, Session, select, col
+from sqlmodel.sql.expression import SelectOfScalar
 
 from .models import (
     CatalogLink,
@@ -19,10 +49,15 @@ from .models import (
     InputSchema,
     SchemaConstraints,
     Template,
+    TemplateHistory,
     TemplateParameter,
     Tables,
 )
 from .config import config, cost_headers, CostMethod
+from . import serialization
+
+if TYPE_CHECKING:
+    import polars as pl
 
 
 ## SQLITE ENGINE
@@ -30,16 +65,303 @@ from .config import config, cost_headers, CostMethod
 logger = logging.getLogger(__name__)
 
 enable_echo = os.getenv("ENABLE_ECHO", "false").lower() == "true"
-sqlite_file_name = "database.db"
+sqlite_file_name = config.database_path or "database.db"
 sqlite_url = f"sqlite:///{sqlite_file_name}"
-engine = create_engine(sqlite_url, echo=enable_echo)
+insert_page_size = int(os.getenv("INSERT_PAGE_SIZE", "1000"))
+yield_batch_size = int(os.getenv("YIELD_BATCH_SIZE", "1000"))
+query_cache_size = int(os.getenv("QUERY_CACHE_SIZE", "1200"))
+drop_existing = os.getenv("DROP_EXISTING", "false").lower() == "true"
+# bump whenever tables or indexes change, so that `init_db` runs the DDL again
+schema_version = 4
+sqlite_max_variables = 999
+max_rows_per_insert = 200
+bulk_load_threshold = int(os.getenv("BULK_LOAD_THRESHOLD", "10000"))
+if sqlite_file_name == ":memory:":
+    # a single shared connection, otherwise each thread sees its own empty database
+    pool_options = {"poolclass": StaticPool}
+else:
+    # writers serialize anyway, a small pool keeps the PRAGMA-tuned connections warm
+    pool_options = {"pool_size": config.connection_pool_size, "max_overflow": 4}
+engine = create_engine(
+    sqlite_url,
+    echo=enable_echo,
+    connect_args={"check_same_thread": False, "timeout": 30},
+    insertmanyvalues_page_size=insert_page_size,
+    query_cache_size=query_cache_size,
+    json_serializer=serialization.dumps,
+    json_deserializer=serialization.loads,
+    **pool_options,
+)
+session_factory = sessionmaker(bind=engine, class_=Session, expire_on_commit=False)
+
+# larger pages suit the catalog text columns, only effective before the first table
+sqlite_page_size = 8192
+sqlite_pragmas = {
+    "page_size": sqlite_page_size,
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "mmap_size": 1073741824,
+    "cache_size": -65536,
+    "foreign_keys": "ON",
+}
+if sqlite_file_name == ":memory:":
+    # no WAL journal nor memory-mapped I/O for in-memory databases
+    del sqlite_pragmas["journal_mode"], sqlite_pragmas["mmap_size"]
+
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection: WAL journal, relaxed sync, memory caches."""
+    cursor = dbapi_connection.cursor()
+    for pragma, value in sqlite_pragmas.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+@event.listens_for(engine, "close")
+def optimize_on_close(dbapi_connection, connection_record):
+    """Let SQLite refresh stale planner statistics before a connection closes."""
+    dbapi_connection.execute("PRAGMA optimize")
+
+
+# close pooled connections on exit, so that they run `PRAGMA optimize`
+atexit.register(engine.dispose)
+
+## HTTP
+
+http_client = httpx.Client(
+    timeout=config.timeout, limits=httpx.Limits(max_keepalive_connections=32)
+)
+atexit.register(http_client.close)
 
 
 def create_db_and_tables(drop_existing: bool = False):
     """Create the database and tables."""
     if drop_existing:
         SQLModel.metadata.drop_all(engine)
+    if sqlite_file_name != ":memory:":
+        set_page_size()
+    migrate_tables()
     SQLModel.metadata.create_all(engine)
+    # `create_all` only builds indexes along with their table
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+def _table_definition(sql: str) -> str:
+    """The column list of a `CREATE TABLE` statement, whitespace-normalized."""
+    return " ".join(sql[sql.index("(") :].split())
+
+
+def migrate_tables():
+    """Rebuild the existing tables whose stored definition differs from the models.
+
+    SQLite cannot add a column `DEFAULT` or a table constraint in place, so each
+    outdated table is copied into a fresh one, following the procedure of
+    https://www.sqlite.org/lang_altertable.html#otheralter. Rows clashing on a
+    new unique constraint or index are dropped, keeping the oldest one, after
+    the duplicated collections are merged and the duplicated template names
+    renamed.
+    """
+    with engine.connect() as conn:
+        stored = dict(
+            conn.exec_driver_sql(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'table'"
+            ).all()
+        )
+        outdated = [
+            table
+            for table in SQLModel.metadata.sorted_tables
+            if table.name in stored
+            and _table_definition(stored[table.name])
+            != _table_definition(str(CreateTable(table).compile(engine)))
+        ]
+    if not stored:
+        return
+    with engine.connect() as conn:
+        # foreign keys can only be toggled outside of a transaction
+        conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        try:
+            # the DDL is not transactional with pysqlite unless explicitly begun
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            if "collection" in stored:
+                merge_duplicate_collections(conn, set(stored))
+            if "template" in stored:
+                rename_duplicate_templates(conn)
+            for table in outdated:
+                logger.info(f"Migrating table {table.name}")
+                rebuild_table(conn, table)
+            conn.commit()
+        finally:
+            conn.rollback()
+            conn.exec_driver_sql(
+                f"PRAGMA foreign_keys={sqlite_pragmas['foreign_keys']}"
+            )
+
+
+def merge_duplicate_collections(conn, tables: Set[str]):
+    """Collapse the collections stored more than once into the one with the lowest id.
+
+    Templates are moved over to the kept collection. The other rows depending on
+    the duplicates (keywords, links, input schemas and their parameters) are
+    deleted, the kept collection holds the same catalog data.
+    """
+    duplicates = (
+        "SELECT id FROM collection AS duplicate WHERE id > (SELECT min(id) "
+        "FROM collection WHERE collection_id = duplicate.collection_id)"
+    )
+    count = conn.exec_driver_sql(f"SELECT count(*) FROM ({duplicates})").scalar()
+    if not count:
+        return
+    logger.warning(f"Merging {count} duplicated collections")
+    if "template" in tables:
+        conn.exec_driver_sql(
+            "UPDATE template SET collection_id = (SELECT min(kept.id) "
+            "FROM collection AS kept JOIN collection AS duplicate "
+            "ON kept.collection_id = duplicate.collection_id "
+            "WHERE duplicate.id = template.collection_id) "
+            f"WHERE collection_id IN ({duplicates})"
+        )
+    delete_rows(conn, Collection.__table__, duplicates, tables - {"template"})
+
+
+def rename_duplicate_templates(conn):
+    """Suffix the names shared by several templates with their id, but the oldest.
+
+    Template names are unique now. A suffixed name never takes an existing one,
+    the renamed templates are logged.
+    """
+    rows = conn.exec_driver_sql("SELECT id, name FROM template ORDER BY id").all()
+    taken = {name for _, name in rows}
+    seen = set()
+    renamed = []
+    for template_id, name in rows:
+        if name not in seen:
+            seen.add(name)
+            continue
+        new_name = f"{name}_{template_id}"
+        while new_name in taken:
+            new_name = f"{new_name}_{template_id}"
+        taken.add(new_name)
+        renamed.append({"template_id": template_id, "new_name": new_name})
+    if not renamed:
+        return
+    conn.execute(
+        Template.__table__.update()
+        .where(Template.__table__.c.id == bindparam("template_id"))
+        .values(name=bindparam("new_name")),
+        renamed,
+    )
+    logger.warning(
+        f"Renamed duplicated templates: {', '.join(r['new_name'] for r in renamed)}"
+    )
+
+
+def delete_rows(conn, table, ids: str, tables: Set[str]):
+    """Delete the rows of `table` selected by the `ids` query, and their dependents.
+
+    Only the `tables` present in the database are visited.
+    """
+    for child in SQLModel.metadata.sorted_tables:
+        if child.name not in tables:
+            continue
+        for foreign_key in child.foreign_keys:
+            if foreign_key.column.table is table:
+                child_ids = (
+                    f"SELECT id FROM {child.name} "
+                    f"WHERE {foreign_key.parent.name} IN ({ids})"
+                )
+                delete_rows(conn, child, child_ids, tables)
+    conn.exec_driver_sql(f"DELETE FROM {table.name} WHERE id IN ({ids})")
+
+
+# tables whose timestamps come from the STAC catalog, in UTC
+utc_timestamp_tables = {"collection"}
+
+
+def local_to_utc_sql(column: str) -> str:
+    """SQL converting a local time column to UTC, keeping its microseconds.
+
+    Timestamps used to be filled in by Python with the local `datetime.now()`,
+    the server defaults replacing it write UTC `CURRENT_TIMESTAMP` values.
+    """
+    return f"strftime('%Y-%m-%d %H:%M:%S', {column}, 'utc') || substr({column}, 20)"
+
+
+def rebuild_table(conn, table):
+    """Copy `table` into a new table built from its model, then swap them."""
+    new_name = f"_new_{table.name}"
+    ddl = str(CreateTable(table).compile(engine))
+    conn.exec_driver_sql(ddl.replace(table.name, new_name, 1))
+    # column name -> stored default
+    existing = {
+        row[1]: row[4]
+        for row in conn.exec_driver_sql(f'PRAGMA table_info("{table.name}")')
+    }
+    targets, sources = [], []
+    for column in table.columns:
+        if column.name not in existing:
+            continue
+        targets.append(f'"{column.name}"')
+        source = f'"{column.name}"'
+        if column.server_default is not None:
+            if existing[column.name] is None and table.name not in utc_timestamp_tables:
+                source = local_to_utc_sql(source)
+            # rows written before the default existed may hold NULLs
+            default = column.server_default.arg.compile(engine)
+            source = f"COALESCE({source}, {default})"
+        sources.append(source)
+    # keep the oldest of the rows clashing on a unique constraint added since
+    unique_columns = [
+        constraint.columns.keys()
+        for constraint in table.constraints
+        if isinstance(constraint, UniqueConstraint)
+    ] + [index.columns.keys() for index in table.indexes if index.unique]
+    filters = [
+        f"rowid IN (SELECT min(rowid) FROM {table.name} GROUP BY {', '.join(names)})"
+        for names in unique_columns
+        if set(existing).issuperset(names)
+    ]
+    conn.exec_driver_sql(
+        f"INSERT INTO {new_name} ({', '.join(targets)}) "
+        f"SELECT {', '.join(sources)} FROM {table.name}"
+        + (f" WHERE {' AND '.join(filters)}" if filters else "")
+    )
+    conn.exec_driver_sql(f"DROP TABLE {table.name}")
+    conn.exec_driver_sql(f"ALTER TABLE {new_name} RENAME TO {table.name}")
+
+
+def set_page_size():
+    """Rebuild an existing database file whose page size is not `sqlite_page_size`.
+
+    The page size of a WAL database cannot change, so the journal is switched
+    back to rollback mode for the `VACUUM`.
+    """
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA page_size").scalar() == sqlite_page_size:
+            return
+        logger.info(f"Rebuilding {sqlite_file_name} with {sqlite_page_size}B pages")
+        conn.exec_driver_sql("PRAGMA journal_mode=DELETE")
+        conn.exec_driver_sql(f"PRAGMA page_size={sqlite_page_size}")
+        conn.exec_driver_sql("VACUUM")
+        conn.exec_driver_sql(f"PRAGMA journal_mode={sqlite_pragmas['journal_mode']}")
+
+
+def init_db(drop_existing: bool = False):
+    """Create the tables, unless the database is already at `schema_version`.
+
+    The version is stored in SQLite's `user_version`, so an initialized
+    database skips the schema DDL entirely.
+    """
+    with engine.connect() as conn:
+        current_version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+    if current_version == schema_version and not drop_existing:
+        return
+    create_db_and_tables(drop_existing=drop_existing)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version={schema_version}")
 
 
 def drop_table(table_name: str):
@@ -47,99 +369,299 @@ def drop_table(table_name: str):
     SQLModel.metadata.drop_all(engine, [table_name])
 
 
+def log_db_errors(action: str):
+    """Log database errors raised by the decorated function, then re-raise them."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except SQLAlchemyError as e:
+                logger.error(f"Error {action}: {e}")
+                raise
+
+        return wrapper
+
+    return decorator
+
+
+def rollback_on_error(method):
+    """Roll the updater session back when the decorated write raises, then re-raise.
+
+    A failed transaction left open keeps SQLite's write lock, so the next write
+    would fail with `database is locked`.
+    """
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except Exception:
+            if self._session is not None:
+                self._session.rollback()
+            raise
+
+    return wrapper
+
+
+@contextmanager
+def _txn(session: Optional[Session] = None) -> Iterator[Session]:
+    """Run in the caller's session, or in a new one committed on exit.
+
+    A passed session is neither committed nor closed: callers chaining several
+    writes pass the same session and commit once, in a single transaction.
+    """
+    if session is not None:
+        yield session
+        return
+    with session_factory() as session:
+        yield session
+        session.commit()
+
+
+@log_db_errors("checking if catalog is loaded")
 def is_catalog_loaded() -> bool:
     """Check if the catalog has been loaded into the database."""
-    try:
-        with Session(engine, expire_on_commit=False) as session:
-            return session.exec(select(Collection).limit(1)).first() is not None
-    except Exception as e:
-        logger.error(f"Error checking if catalog is loaded: {e}")
-        raise e
+    with session_factory() as session:
+        return session.exec(select(exists().select_from(Collection))).one()
+
+
+def chunk_size(model: Type[SQLModel]) -> int:
+    """Number of rows per statement that keeps bound parameters under SQLite's limit."""
+    columns = len(model.__table__.columns)
+    return max(1, min(max_rows_per_insert, sqlite_max_variables // columns))
+
+
+def bulk_insert(
+    model: Type[SQLModel],
+    rows: List[Dict[str, Any]],
+    conflict_columns: Optional[List[str]] = None,
+    session: Optional[Session] = None,
+):
+    """Insert plain row dicts with multi-row `INSERT ... VALUES`, bypassing the ORM.
+
+    Each statement carries `chunk_size(model)` rows, all within one transaction,
+    opened with `BEGIN IMMEDIATE` so that the write lock is taken upfront unless
+    `session` is already writing.
+    Rows clashing with existing ones on the unique `conflict_columns` are
+    skipped with `ON CONFLICT DO NOTHING`.
+    From `bulk_load_threshold` rows, non-unique indexes are dropped before the
+    load and rebuilt in a single pass afterwards, then the table is analyzed.
+    Rows must share the same keys. Relationships are not persisted, and no ORM
+    events are fired for the inserted rows.
+    """
+    if not rows:
+        return
+    size = chunk_size(model)
+    large_load = len(rows) >= bulk_load_threshold
+    rebuilt_indexes = []
+    if large_load:
+        # unique indexes stay, they enforce constraints and back ON CONFLICT
+        rebuilt_indexes = [idx for idx in model.__table__.indexes if not idx.unique]
+    with _txn(session) as session:
+        conn = session.connection()
+        if not conn.connection.dbapi_connection.in_transaction:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        for index in rebuilt_indexes:
+            index.drop(conn)
+        for start in range(0, len(rows), size):
+            stmt = sqlite_insert(model.__table__).values(rows[start : start + size])
+            if conflict_columns:
+                stmt = stmt.on_conflict_do_nothing(index_elements=conflict_columns)
+            conn.execute(stmt)
+        for index in rebuilt_indexes:
+            index.create(conn)
+        if large_load:
+            # refresh the planner statistics, so lookups keep picking the indexes
+            conn.exec_driver_sql(f"ANALYZE {model.__tablename__}")
+
+
+def model_rows(models: List[SQLModel]) -> List[Dict[str, Any]]:
+    """Dump SQLModel instances to column dicts suitable for `bulk_insert`.
+
+    Server-side defaults (timestamps) unset on every model are left out, so the
+    database fills them in once per statement. When only some models set them,
+    the others get the SQL expression, so that every row keeps the same keys.
+    """
+    if not models:
+        return []
+    server_defaults = {
+        column.name: column.server_default.arg
+        for column in type(models[0]).__table__.columns
+        if column.server_default is not None
+    }
+    rows = [model.model_dump(exclude={"id"}) for model in models]
+    for name, default in server_defaults.items():
+        if all(row.get(name) is None for row in rows):
+            for row in rows:
+                row.pop(name, None)
+            continue
+        for row in rows:
+            if row.get(name) is None:
+                row[name] = default
+    return rows
+
+
+@log_db_errors("inserting catalog links")
+def insert_catalog_links(
+    catalog_links: List[CatalogLink],
+    bulk: bool = True,
+    session: Optional[Session] = None,
+):
+    """Insert catalog links into the database.
+
+    With `bulk=True` (default), links are inserted through `bulk_insert`.
+    Use `bulk=False` when the inserted instances must be populated with their
+    generated IDs.
+    A passed `session` is left uncommitted, see `_txn`.
+    """
+    if bulk:
+        bulk_insert(
+            CatalogLink,
+            model_rows(catalog_links),
+            conflict_columns=["collection_url"],
+            session=session,
+        )
+        return
+    with _txn(session) as session:
+        session.add_all(catalog_links)
 
 
-def insert_catalog_links(catalog_links: List[CatalogLink]):
-    """Insert catalog links into the database."""
-    try:
-        with Session(engine, expire_on_commit=False) as session:
-            session.add_all(catalog_links)
-            session.commit()
-    except Exception as e:
-        logger.error(f"Error inserting catalog links: {e}")
-        raise e
+def has_children(collection: Collection) -> bool:
+    """Whether a collection carries related rows that only the ORM path persists."""
+    return bool(collection.keywords or collection.links or collection.input_schema)
 
 
-def insert_collections(collections: List[Collection]):
-    """Insert collections into the database."""
-    try:
-        with Session(engine, expire_on_commit=False) as session:
-            session.add_all(collections)
-            session.commit()
-    except Exception as e:
-        logger.error(f"Error inserting collections: {e}")
-        raise e
+@log_db_errors("inserting collections")
+def insert_collections(
+    collections: List[Collection],
+    bulk: bool = True,
+    session: Optional[Session] = None,
+):
+    """Insert collections into the database.
+
+    With `bulk=True` (default), collections are inserted through `bulk_insert`,
+    skipping dataset IDs already stored, unless one of them carries keywords,
+    links or an input schema, in which case the ORM path is used so that
+    related rows are persisted too.
+    A passed `session` is left uncommitted, see `_txn`.
+    """
+    if bulk and not any(has_children(c) for c in collections):
+        bulk_insert(
+            Collection,
+            model_rows(collections),
+            conflict_columns=["collection_id"],
+            session=session,
+        )
+        return
+    with _txn(session) as session:
+        session.add_all(collections)
 
 
+@log_db_errors("getting collection from ID")
 def collection_from_id(
     collection_id: int, session: Optional[Session] = None
 ) -> Collection:
-    """Get a collection from an ID."""
+    """Get a collection from an ID, from the identity map when already loaded."""
     logger.info(f"Getting collection from ID: {collection_id}")
     logger.info(f"Session: {session}")
-    try:
-        if session is None:
-            session = Session(engine)
-        return session.exec(
-            select(Collection).where(Collection.id == collection_id)
-        ).first()
-    except Exception as e:
-        logger.error(f"Error getting collection from ID: {e}")
-        raise e
+    if session is None:
+        session = session_factory()
+    return session.get(Collection, collection_id)
+
+
+def collection_by_dataset_id_stmt(dataset_id: str) -> StatementLambdaElement:
+    """Cached statement selecting a collection row, compiled once per process."""
+    table = Collection.__table__
+    return lambda_stmt(
+        lambda: select(table).where(table.c.collection_id == dataset_id).limit(1)
+    )
 
 
+@log_db_errors("getting collection from dataset ID")
 def collection_from_dataset_id(
     dataset_id: str, session: Optional[Session] = None
 ) -> Collection:
-    """Get a collection from a dataset ID."""
-    try:
-        if session is None:
-            session = Session(engine)
-        with session:
-            return session.exec(
-                select(Collection).where(Collection.collection_id == dataset_id)
-            ).first()
-    except Exception as e:
-        logger.error(f"Error getting collection from dataset ID: {e}")
-        raise e
+    """Get a collection from a dataset ID.
+
+    The row is read with a Core select and returned as a transient `Collection`,
+    without identity map bookkeeping nor eager loading of its relationships.
+    """
+    with _txn(session) as session:
+        row = (
+            session.connection()
+            .execute(collection_by_dataset_id_stmt(dataset_id))
+            .mappings()
+            .first()
+        )
+        return Collection(**row) if row else None
 
 
 def template_parameters_from_id(
     template_id: int, session: Optional[Session] = None
 ) -> List[TemplateParameter]:
     if session is None:
-        session = Session(engine)
-    return list(
-        session.exec(
-            select(TemplateParameter).where(
-                TemplateParameter.template_id == template_id
-            )
-        )
-    )
+        session = session_factory()
+    return session.exec(
+        select(TemplateParameter).where(TemplateParameter.template_id == template_id)
+    ).all()
 
 
-def list_items(table: Tables, limit: Optional[int] = None):
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    """The smallest string sorting after every string starting with `prefix`.
+
+    `column >= prefix AND column < prefix_upper_bound(prefix)` is a prefix match
+    that SQLite runs as an index range scan, unlike a case-insensitive LIKE.
+    `None` when no such string exists, e.g. for an empty prefix.
     """
-    List items from the database.
+    stripped = prefix.rstrip(chr(sys.maxunicode))
+    if not stripped:
+        return None
+    code_point = ord(stripped[-1]) + 1
+    if 0xD800 <= code_point <= 0xDFFF:
+        # surrogates cannot be encoded, SQLite compares the UTF-8 bytes
+        code_point = 0xE000
+    return stripped[:-1] + chr(code_point)
+
+
+def iter_items(
+    table: Tables,
+    limit: Optional[int] = None,
+    after_id: Optional[int] = None,
+    session: Optional[Session] = None,
+) -> Iterator[SQLModel]:
+    """
+    Iterate over items from the database, fetching rows in batches of
+    `yield_batch_size`.
+
+    Pages are keyed on the primary key: pass the last seen `id` as `after_id`
+    to get the next page, which avoids scanning the rows an OFFSET would skip.
     """
     try:
-        with Session(engine) as session:
+        with _txn(session) as session:
             query = select(table.model)
-            if limit:
+            if after_id is not None:
+                query = query.where(table.model.id > after_id).order_by(table.model.id)
+            if limit is not None:
                 query = query.limit(limit)
-            result = session.exec(query).fetchall()
-            return list(result)
-    except Exception as e:
+            query = query.execution_options(yield_per=yield_batch_size)
+            yield from session.exec(query)
+    except SQLAlchemyError as e:
         logger.error(f"Error listing items: {e}")
-        raise e
+        raise
+
+
+def list_items(
+    table: Tables,
+    limit: Optional[int] = None,
+    after_id: Optional[int] = None,
+    session: Optional[Session] = None,
+):
+    """
+    List items from the database.
+    """
+    return list(iter_items(table, limit, after_id, session))
 
 
 def add_metadata(
@@ -162,16 +684,34 @@ def parse_metadata(state: Dict[str, Any]) -> Tuple[dict, dict]:
 # TODO: refactor submodule, clean stuff up
 
 
-def list_non_null_columns(df: pl.DataFrame) -> list[str]:
+def list_non_null_columns(df: "pl.DataFrame") -> list[str]:
     """List columns that do not have null values."""
     null_counts = df.null_count()
     return [column.name for column in null_counts if column.sum() == 0]
 
 
-def list_non_null_fields(data: dict) -> list[str]:
-    """List fields that do not have null values."""
-    df = pl.DataFrame(data)
-    return list_non_null_columns(df)
+def has_none(values: Any) -> bool:
+    """Whether a value is null, or a list containing a null value."""
+    return values is None or (
+        isinstance(values, list) and any(v is None for v in values)
+    )
+
+
+def list_non_null_fields(
+    data: List[Dict[str, Any]] | Dict[str, List[Any]],
+) -> list[str]:
+    """List fields that do not have null values.
+
+    Accepts row-oriented data (a list of dicts, as served by the constraints
+    endpoint), where a field missing from a row counts as null, or
+    column-oriented data (a dict of lists).
+    """
+    if isinstance(data, dict):
+        return [key for key, values in data.items() if not has_none(values)]
+    fields = dict.fromkeys(key for row in data for key in row)
+    return [
+        field for field in fields if all(row.get(field) is not None for row in data)
+    ]
 
 
 class CollectionBrowser:
@@ -193,10 +733,16 @@ class CollectionBrowser:
     dataset_id: str
     constraints_url: Optional[str]
     _constraints: Optional[dict] = None
+    _constraints_fetched: bool = False
+    _cached_properties = (
+        "input_schema",
+        "constraints_url",
+        "are_mandatory_params_stored",
+    )
 
     def __init__(self, dataset_id: str):
         self.dataset_id = dataset_id
-        self.session = Session(engine, expire_on_commit=False)
+        self.session = session_factory()
         self.parameters = self.fetch_parameters()
         self.collection = collection_from_dataset_id(self.dataset_id, self.session)
 
@@ -206,8 +752,14 @@ class CollectionBrowser:
 
     def refresh(self):
         # TODO: add constraint refresh without creating duplicates
+        self._invalidate_cache()
         self.parameters = self.fetch_parameters()
 
+    def _invalidate_cache(self):
+        """Drops the memoized schema, constraints URL and mandatory parameters flag."""
+        for name in self._cached_properties:
+            self.__dict__.pop(name, None)
+
     def fetch_parameters(self) -> List[InputParameter]:
         with self.session as session:
             return session.exec(
@@ -217,47 +769,46 @@ class CollectionBrowser:
                 .where(Collection.collection_id == self.dataset_id)
             ).fetchall()
 
-    @property
+    @cached_property
     def input_schema(self) -> Optional[InputSchema]:
         with self.session as session:
             return session.exec(
-                select(InputSchema).where(
-                    InputSchema.collection_id == self.collection.id
-                )
+                select(InputSchema)
+                .options(selectinload(InputSchema.schema_constraints))
+                .where(InputSchema.collection_id == self.collection.id)
             ).first()
 
-    @property
+    @cached_property
     def are_mandatory_params_stored(self) -> bool:
         with self.session as session:
-            return (
-                session.exec(
-                    select(InputParameter)
+            return session.exec(
+                select(
+                    select(InputParameter.id)
                     .join(InputSchema, InputParameter.input_schema_id == InputSchema.id)
                     .join(Collection, InputSchema.collection_id == Collection.id)
                     .where(Collection.collection_id == self.dataset_id)
                     .where(col(InputParameter.is_mandatory).is_not(None))
-                    .limit(1)
-                ).one_or_none()
-                is not None
-            )
+                    .exists()
+                )
+            ).one()
 
-    @property
+    @cached_property
     def constraints_url(self) -> Optional[str]:
-        links = self.session.exec(
-            select(CollectionLink).where(
-                CollectionLink.collection_id == self.collection.id
+        return self.session.exec(
+            select(CollectionLink.url)
+            .where(
+                CollectionLink.collection_id == self.collection.id,
+                CollectionLink.rel == CollectionRelType.constraints,
             )
-        ).fetchall()
-        for link in links:
-            if link.rel == CollectionRelType.constraints:
-                return link.url
-        return None
+            .limit(1)
+        ).first()
 
     @property
     def constraints(self) -> Optional[dict]:
         # TODO: add a local db store for constraints JSON
         """Constraints on input parameters. Fetches the constraints from the API endpoint, only called if not already fetched."""
-        if not self._constraints:
+        if not self._constraints and not self._constraints_fetched:
+            self._constraints_fetched = True
             with self.session:
                 logger.info(
                     f"Input schema: {type(self.input_schema)} with constraints: {type(self.input_schema.schema_constraints)}"
@@ -276,13 +827,11 @@ class CollectionBrowser:
         if not self.constraints_url:
             return None
         try:
-            client = httpx.Client()
-            response = client.get(self.constraints_url)
-            self._constraints = response.json()
+            self._constraints = http_client.get(self.constraints_url).json()
             with self.session as session:
                 session.add(
                     SchemaConstraints(
-                        input_schema_id=self.collection.input_schema.id,
+                        input_schema_id=self.input_schema.id,
                         collection_id=self.collection.id,
                         constraints=self._constraints,
                     )
@@ -327,7 +876,14 @@ class CollectionBrowser:
                 f"Mandatory parameters for {self.dataset_id} stored, fetching from database"
             )
 
-        return [param.name for param in self.parameters if param.is_mandatory]
+        with self.session as session:
+            return session.exec(
+                select(InputParameter.name)
+                .join(InputSchema, InputParameter.input_schema_id == InputSchema.id)
+                .join(Collection, InputSchema.collection_id == Collection.id)
+                .where(Collection.collection_id == self.dataset_id)
+                .where(col(InputParameter.is_mandatory).is_(True))
+            ).all()
 
     def validate_template(self, template: Template) -> Dict[str, bool]:
         """Validates a template against the constraints.
@@ -355,6 +911,16 @@ def state_cost_estimate(data: dict) -> CostEstimate:
         key: len(values) if isinstance(values, list) else 1
         for key, values in data.items()
     }
+    if all(n_params.values()):
+        # compare in log space first, the exact product is only needed when it's small
+        log_cost = sum(log(n) for n in n_params.values())
+        if log_cost > log(config.max_cost_estimate):
+            return CostEstimate(
+                cost=exp(min(log_cost, 700)),
+                limit=config.max_cost_estimate,
+                request_is_valid=False,
+                invalid_reason="cost overflow",
+            )
     return CostEstimate(
         cost=max(1, prod(n_params.values())),
         limit=-1,
@@ -363,6 +929,33 @@ def state_cost_estimate(data: dict) -> CostEstimate:
     )
 
 
+@lru_cache(maxsize=256)
+def fetch_cost_response(dataset_id: str, payload: str) -> str:
+    """POST a serialized cost request, memoized per dataset and payload."""
+    response = http_client.post(
+        config.cost_endpoint.format(dataset_id=dataset_id),
+        content=payload,
+        headers=cost_headers(dataset_id),
+    )
+    response.raise_for_status()
+    return response.text
+
+
+def insert_parameters(session: Session, rows: List[Dict[str, Any]]):
+    """Insert template parameter rows, skipping values the template already has."""
+    if not rows:
+        return
+    session.exec(sqlite_insert(TemplateParameter).on_conflict_do_nothing(), params=rows)
+
+
+def state_digest(data: dict) -> str:
+    """
+    Digest of a template state (in python dict format), used to detect no-op changes
+    """
+    serialized = json.dumps(data, sort_keys=True).encode()
+    return hashlib.blake2b(serialized, digest_size=16).hexdigest()
+
+
 class TemplateUpdater:
     """
     A class to help with template operations.
@@ -373,11 +966,13 @@ class TemplateUpdater:
     template: Template
     collection: Collection
     _session: Optional[Session]
+    _pending_history: bool = False
+    _history_digest: Optional[str] = None
 
     @property
     def session(self):
         if not self._session:
-            self._session = Session(engine, expire_on_commit=False)
+            self._session = session_factory()
         return self._session
 
     @property
@@ -386,71 +981,71 @@ class TemplateUpdater:
 
     @property
     def parameter_names(self) -> List[str]:
-        with self._session as session:
-            return list(
-                session.exec(
-                    select(TemplateParameter.name)
-                    .where(TemplateParameter.template_id == self.template.id)
-                    .distinct()
-                ).fetchall()
-            )
+        session = self._session
+        return session.exec(
+            select(TemplateParameter.name)
+            .where(TemplateParameter.template_id == self.template.id)
+            .distinct()
+        ).all()
 
     @property
     def template_exists(self) -> bool:
-        with self._session as session:
-            return (
-                session.exec(
-                    select(Template).where(Template.name == self.template_name)
-                ).first()
-                is not None
-            )
+        session = self._session
+        return session.exec(
+            select(exists().where(Template.name == self.template_name))
+        ).one()
 
     @property
     def cost(self) -> float:
         return self.template.cost
 
     @staticmethod
-    def list(limit: Optional[int] = None) -> List[Template]:
-        with Session(engine, expire_on_commit=False) as session:
+    def iter_templates(limit: Optional[int] = None) -> Iterator[Template]:
+        with session_factory() as session:
             query = select(Template)
-            if limit:
+            if limit is not None:
                 query = query.limit(limit)
-            return list(session.exec(query).fetchall())
+            yield from session.exec(query.execution_options(yield_per=yield_batch_size))
+
+    @staticmethod
+    def list(limit: Optional[int] = None) -> List[Template]:
+        return list(TemplateUpdater.iter_templates(limit))
 
     def init_from_template(self, template: Template):
         self.template = template
         self.collection = collection_from_id(template.collection_id, self.session)
         self.dataset_id = self.collection.collection_id
 
-        with self._session as session:
-            session.merge(self.template)
-            session.merge(self.collection)
+        session = self._session
+        session.merge(self.template)
+        session.merge(self.collection)
 
     def init_from_name(self, template_name: str) -> bool:
         """Returns `True` if existing template found, `False` if not and create needed"""
-        with self._session as session:
-            self.template = session.exec(
-                select(Template).where(Template.name == template_name)
-            ).first()
-            if not self.template:
-                return False
-            self.template_name = template_name
-            self.collection = session.exec(
-                select(Collection).where(Collection.id == self.template.collection_id)
-            ).first()
-            self.dataset_id = self.collection.collection_id
+        session = self._session
+        self.template = session.exec(
+            select(Template)
+            .options(selectinload(Template.parameters))
+            .where(Template.name == template_name)
+        ).first()
+        if not self.template:
+            return False
+        self.template_name = template_name
+        self.collection = session.get(Collection, self.template.collection_id)
+        self.dataset_id = self.collection.collection_id
         return True
 
+    @rollback_on_error
     def create_template(self, template_name: str, dataset_id: str):
-        with self._session as session:
-            self.collection = session.exec(
-                select(Collection).where(Collection.collection_id == dataset_id)
-            ).first()
-            self.template = Template(
-                name=template_name, collection_id=self.collection.id, cost=0
-            )
-            session.add(self.template)
-            session.commit()
+        session = self._session
+        self.collection = session.exec(
+            select(Collection).where(Collection.collection_id == dataset_id)
+        ).first()
+        self.template = Template(
+            name=template_name, collection_id=self.collection.id, cost=0
+        )
+        session.add(self.template)
+        session.commit()
 
     @classmethod
     def from_json(cls, path: Optional[Path] = None, json_data: Optional[str] = None):
@@ -458,9 +1053,9 @@ class TemplateUpdater:
             raise ValueError("Either path or json_data must be provided")
 
         if path:
-            data = json.load(path.open())
+            data = serialization.load(path)
         else:
-            data = json.loads(json_data) if json_data else {}
+            data = serialization.loads(json_data) if json_data else {}
 
         if not data:
             raise ValueError(f"Could not read JSON from file {path}")
@@ -486,7 +1081,7 @@ class TemplateUpdater:
         self.template_name = template_name
         self.template = None
         self.collection = None
-        self._session = Session(engine, expire_on_commit=False)
+        self._session = session_factory()
 
         if template is not None:
             self.init_from_template(template)
@@ -523,31 +1118,42 @@ class TemplateUpdater:
             The template if it exists, otherwise `None`.
         """
         if session is None:
-            session = Session(engine, expire_on_commit=False)
+            session = session_factory()
         with session:
             template: Optional[Template] = session.exec(
-                select(Template).where(Template.name == template_name)
+                select(Template)
+                .options(selectinload(Template.parameters))
+                .where(Template.name == template_name)
             ).first()
         if template is None:
             return None
         return template
 
+    @rollback_on_error
     def commit(self):
-        with self._session as session:
-            session.add(self.template)
-            session.add_all(self.parameters)
-            session.commit()
+        session = self._session
+        session.add(self.template)
+        session.add_all(self.parameters)
+        session.commit()
+
+    def close(self):
+        """Closes the long-lived session, call it once done with the updater."""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def __enter__(self) -> "TemplateUpdater":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def to_dict(self) -> Dict[str, Any]:
-        serialized = {}
-        with self._session:
-            for parameter in self.parameters:
-                if parameter.name not in serialized:
-                    serialized[parameter.name] = [parameter.value]
-                else:
-                    if parameter.value not in serialized[parameter.name]:
-                        serialized[parameter.name].append(parameter.value)
-            return serialized
+        # (template_id, name, value) is unique, values never repeat
+        serialized = defaultdict(list)
+        for parameter in self.parameters:
+            serialized[parameter.name].append(parameter.value)
+        return dict(serialized)
 
     def to_json(self, indent: Optional[int] = None, with_metadata: bool = True) -> str:
         """
@@ -568,133 +1174,244 @@ class TemplateUpdater:
         state = self.to_dict()
         metadata = {"dataset_id": self.dataset_id, "template_name": self.template_name}
         result = {"metadata": metadata, "parameters": state} if with_metadata else state
-        return json.dumps(result, indent=indent)
+        return serialization.dumps(result, indent=indent)
 
     def refresh(self):
-        with self._session as session:
-            session.merge(self.template)
-            session.merge(self.collection)
-            session.refresh(self.template, ["parameters", "collection"])
-            self.dataset_id = self.collection.collection_id
+        session = self._session
+        session.merge(self.template)
+        session.merge(self.collection)
+        session.refresh(self.template, ["parameters", "collection"])
+        self.dataset_id = self.collection.collection_id
 
+    @rollback_on_error
+    def flush_history(self, session: Session):
+        """Writes a single history snapshot of the template state, if changes are pending.
+
+        The snapshot is skipped when the state is identical to the latest one.
+        """
+        if not self._pending_history:
+            return
+        self._pending_history = False
+        state = self.to_dict()
+        digest = state_digest(state)
+        if self._history_digest is None:
+            latest = self.fetch_latest_history(session)
+            self._history_digest = state_digest(latest.data) if latest else None
+        if digest == self._history_digest:
+            return
+        session.add(TemplateHistory(template_id=self.template.id, data=state))
+        session.commit()
+        self._history_digest = digest
+
+    def history_query(self) -> SelectOfScalar[TemplateHistory]:
+        return (
+            select(TemplateHistory)
+            .where(TemplateHistory.template_id == self.template.id)
+            .order_by(
+                col(TemplateHistory.created_at).desc(), col(TemplateHistory.id).desc()
+            )
+        )
+
+    def fetch_latest_history(
+        self, session: Optional[Session] = None
+    ) -> Optional[TemplateHistory]:
+        """Returns the most recent history snapshot of the template, if any."""
+        session = session or self._session
+        return session.exec(self.history_query().limit(1)).first()
+
+    def fetch_history_window(
+        self, n: int, session: Optional[Session] = None
+    ) -> List[TemplateHistory]:
+        """Returns the `n` most recent history snapshots of the template, newest first."""
+        session = session or self._session
+        return session.exec(self.history_query().limit(n)).all()
+
+    @rollback_on_error
     def add_parameter_range(self, parameter_name: str, from_value: str, to_value: str):
-        with self._session:
-            for value in range(int(from_value), int(to_value) + 1):
-                self.add_parameter(parameter_name, str(value))
+        session = self._session
+        template = session.get(Template, self.template.id)
+        insert_parameters(
+            session,
+            [
+                {
+                    "template_id": template.id,
+                    "name": parameter_name,
+                    "value": str(value),
+                }
+                for value in range(int(from_value), int(to_value) + 1)
+            ],
+        )
+        session.commit()
+        session.refresh(template, ["parameters"])
+        self.template = template
+        self._pending_history = True
+        logger.debug(
+            f"Added parameter range {from_value}-{to_value} for {parameter_name} to template {self.template.name}"
+        )
+        self.flush_history(session)
 
+    @rollback_on_error
     def add_parameter(self, parameter_name: str, parameter_value: str):
-        with self._session as session:
-            template = session.get(Template, self.template.id)
-            new_parameter = TemplateParameter(
-                template=template, name=parameter_name, value=parameter_value
-            )
-            session.add(new_parameter)
-            template.parameters.append(new_parameter)
-            session.commit()
-            session.refresh(template, ["parameters"])
-            self.template = template
-            logger.debug(
-                f"Added parameter {parameter_name} to template {self.template.name}"
-            )
+        session = self._session
+        template = session.get(Template, self.template.id)
+        insert_parameters(
+            session,
+            [
+                {
+                    "template_id": template.id,
+                    "name": parameter_name,
+                    "value": parameter_value,
+                }
+            ],
+        )
+        session.commit()
+        session.refresh(template, ["parameters"])
+        self.template = template
+        self._pending_history = True
+        logger.debug(
+            f"Added parameter {parameter_name} to template {self.template.name}"
+        )
+        self.flush_history(session)
 
+    @rollback_on_error
     def update_parameter_value(
         self, parameter_name: str, old_value: str, new_value: str
     ):
-        with self._session as session:
-            to_update = session.exec(
-                select(TemplateParameter).where(
+        session = self._session
+        to_update = session.exec(
+            select(TemplateParameter).where(
+                TemplateParameter.template_id == self.template.id,
+                TemplateParameter.name == parameter_name,
+                TemplateParameter.value == old_value,
+            )
+        ).first()
+        if to_update is None:
+            raise ValueError(f"Parameter {parameter_name} not found")
+        if new_value == old_value:
+            return
+        # the new value may already be stored, insert it (or not) then drop the old one
+        insert_parameters(
+            session,
+            [
+                {
+                    "template_id": self.template.id,
+                    "name": parameter_name,
+                    "value": new_value,
+                }
+            ],
+        )
+        session.delete(to_update)
+        session.commit()
+        self.template = session.get(Template, self.template.id)
+        session.refresh(self.template, ["parameters"])
+        self._pending_history = True
+        self.flush_history(session)
+
+    @rollback_on_error
+    def update_parameter_values(self, parameter_name: str, parameter_values: List[str]):
+        session = self._session
+        existing_values = set(
+            session.exec(
+                select(TemplateParameter.value).where(
                     TemplateParameter.template_id == self.template.id,
                     TemplateParameter.name == parameter_name,
-                    TemplateParameter.value == old_value,
                 )
-            ).first()
-            if to_update is None:
-                raise ValueError(f"Parameter {parameter_name} not found")
-            to_update.value = new_value
-            session.add(to_update)
-            session.commit()
-
-    def update_parameter_values(self, parameter_name: str, parameter_values: List[str]):
-        with self._session as session:
-            to_update = session.exec(
-                select(TemplateParameter).where(
+            ).fetchall()
+        )
+        new_values = set(parameter_values).difference(existing_values)
+        to_remove = existing_values.difference(parameter_values)
+        insert_parameters(
+            session,
+            [
+                {
+                    "template_id": self.template.id,
+                    "name": parameter_name,
+                    "value": value,
+                }
+                for value in new_values
+            ],
+        )
+        if to_remove:
+            session.exec(
+                delete(TemplateParameter).where(
                     TemplateParameter.template_id == self.template.id,
                     TemplateParameter.name == parameter_name,
+                    col(TemplateParameter.value).in_(to_remove),
                 )
-            ).fetchall()
-            existing_values = set(param.value for param in to_update)
-            new_values = set(parameter_values).difference(existing_values)
-            for value in new_values:
-                self.add_parameter(parameter_name, value)
-            for value in existing_values.difference(parameter_values):
-                self.remove_parameter_value(parameter_name, value)
+            )
+        session.commit()
+        self.template = session.get(Template, self.template.id)
+        session.refresh(self.template, ["parameters"])
+        self._pending_history = True
+        self.flush_history(session)
 
     def get_parameter_values(self, name: str) -> List[str]:
         """Returns all values for parameter name `name`."""
-        with self._session:
-            return [param.value for param in self.parameters if param.name == name]
+        return [param.value for param in self.parameters if param.name == name]
 
+    @rollback_on_error
     def remove_parameter_value(self, parameter_name: str, parameter_value: str):
-        with self._session as session:
-            template = session.get(Template, self.template.id)
-            to_remove = session.exec(
-                select(TemplateParameter).where(
-                    TemplateParameter.template_id == template.id,
-                    TemplateParameter.name == parameter_name,
-                    TemplateParameter.value == parameter_value,
-                )
-            ).fetchall()
-            if to_remove is None:
-                raise ValueError(f"Parameter {parameter_name} not found")
-            for param in to_remove:
-                logger.debug(
-                    f"Removing parameter value {param.value} for parameter {param.name} from template {self.template.name}"
-                )
-                session.delete(param)
-                template.parameters.remove(param)
-            session.commit()
-            session.refresh(template, ["parameters"])
-            self.template = template
+        session = self._session
+        template = session.get(Template, self.template.id)
+        session.exec(
+            delete(TemplateParameter).where(
+                TemplateParameter.template_id == template.id,
+                TemplateParameter.name == parameter_name,
+                TemplateParameter.value == parameter_value,
+            )
+        )
+        logger.debug(
+            f"Removing parameter value {parameter_value} for parameter {parameter_name} from template {self.template.name}"
+        )
+        session.commit()
+        session.refresh(template, ["parameters"])
+        self.template = template
+        self._pending_history = True
+        self.flush_history(session)
 
+    @rollback_on_error
     def remove_parameter(self, parameter_name: str):
-        with self._session as session:
-            template = session.get(Template, self.template.id)
-            parameters = template.parameters
-            parameter_values = [
-                param for param in parameters if param.name == parameter_name
-            ]
-            if not parameter_values:  # TODO: check if this is correct
-                raise ValueError(f"Parameter {parameter_name} not found")
-            for param in parameter_values:
-                session.delete(param)
-                template.parameters.remove(param)
-            session.commit()
-            session.refresh(template, ["parameters"])
-            self.template = template
-            logger.debug(
-                f"Removed parameter {parameter_name} from template {self.template.name}"
+        session = self._session
+        template = session.get(Template, self.template.id)
+        result = session.exec(
+            delete(TemplateParameter).where(
+                TemplateParameter.template_id == template.id,
+                TemplateParameter.name == parameter_name,
             )
+        )
+        if not result.rowcount:
+            session.rollback()
+            raise ValueError(f"Parameter {parameter_name} not found")
+        session.commit()
+        session.refresh(template, ["parameters"])
+        self.template = template
+        self._pending_history = True
+        logger.debug(
+            f"Removed parameter {parameter_name} from template {self.template.name}"
+        )
+        self.flush_history(session)
 
     def from_dict(self, data: Dict[str, Any]):
         # TODO: find a way to set current state from a dict
         raise NotImplementedError("Be patient.")
 
     def allowed_parameters(self, hide_values: bool = False) -> List[SQLModel]:
-        with self._session as session:
-            collection_parameters = session.exec(
-                select(InputParameter, InputSchema, Collection)
-                .join(InputSchema, InputParameter.input_schema_id == InputSchema.id)
-                .join(Collection, InputSchema.collection_id == Collection.id)
-                .where(Collection.id == self.collection.id)
-            ).fetchall()
-            if hide_values:
-                params = []
-                for param, schema, collection in collection_parameters:
-                    delattr(param, "values")
-                    params.append(param)
-                return params
-            return [param for param, schema, collection in collection_parameters]
-
+        session = self._session
+        collection_parameters = session.exec(
+            select(InputParameter, InputSchema, Collection)
+            .join(InputSchema, InputParameter.input_schema_id == InputSchema.id)
+            .join(Collection, InputSchema.collection_id == Collection.id)
+            .where(Collection.id == self.collection.id)
+        ).fetchall()
+        if hide_values:
+            params = []
+            for param, schema, collection in collection_parameters:
+                delattr(param, "values")
+                params.append(param)
+            return params
+        return [param for param, schema, collection in collection_parameters]
+
+    @rollback_on_error
     def compute_cost(
         self, method: CostMethod, commit_update: bool = False
     ) -> CostEstimate:
@@ -707,10 +1424,10 @@ class TemplateUpdater:
                 raise ValueError(f"Invalid cost method: {method}")
 
         if commit_update:
-            with self._session as session:
-                session.merge(self.template)
-                session.refresh(self.template)
-                session.commit()
+            session = self._session
+            session.merge(self.template)
+            session.refresh(self.template)
+            session.commit()
 
         return cost_estimate
 
@@ -723,29 +1440,26 @@ class TemplateUpdater:
         return state_cost_estimate(data)
 
     def _fetch_cost(self) -> CostEstimate:
-        client = httpx.Client()
-        endpoint = config.cost_endpoint.format(dataset_id=self.dataset_id)
-        response = client.post(
-            endpoint,
-            json={"inputs": self.to_dict()},
-            headers=cost_headers(self.dataset_id),
-        )
-        data = response.json()
+        payload = serialization.dumps({"inputs": self.to_dict()}, sort_keys=True)
+        data = serialization.loads(fetch_cost_response(self.dataset_id, payload))
 
         return CostEstimate.from_response(data)
 
+    @rollback_on_error
     def delete(self):
         # TODO: when deleting, make sure cascade delete happens on parameters
-        with self._session as session:
-            logger.debug(f"Deleting template {self.template.name}")
-            to_delete = session.exec(
-                select(Template).where(Template.id == self.template.id)
-            ).fetchall()
-            for template in to_delete:
-                for parameter in template.parameters:
-                    session.delete(parameter)
-                session.delete(template)
-            session.commit()
+        session = self._session
+        logger.debug(f"Deleting template {self.template.name}")
+        to_delete = session.exec(
+            select(Template)
+            .options(selectinload(Template.parameters))
+            .where(Template.id == self.template.id)
+        ).fetchall()
+        for template in to_delete:
+            for parameter in template.parameters:
+                session.delete(parameter)
+            session.delete(template)
+        session.commit()
 
     @staticmethod
     def create_template_from_dict(
@@ -753,59 +1467,48 @@ class TemplateUpdater:
     ) -> Tuple[Template, Session]:
         metadata, parameters = parse_metadata(data)
         if session is None:
-            session = Session(engine, expire_on_commit=False)
+            session = session_factory()
 
         collection = collection_from_dataset_id(metadata["dataset_id"], session)
         template_name = metadata["template_name"]
-        existing_parameters = []
+        template = TemplateUpdater.fetch_by_name(template_name, session)
+        existing_names = set()
+        if template:
+            logger.warning(
+                f"Template with name '{template_name}' already exists, updating it."
+            )
+            existing_names = {param.name for param in template.parameters}
         with session:
-            existing_template = TemplateUpdater.fetch_by_name(template_name, session)
-            if existing_template:
-                logger.warning(
-                    f"Template with name '{template_name}' already exists, updating it."
-                )
-                template = existing_template
-                existing_parameters = template.parameters
-            else:
-                template = Template(
-                    name=metadata["template_name"],
-                    collection_id=collection.id,
-                    cost=state_cost_estimate(parameters).cost,
-                )
+            with session.begin():
+                if template is None:
+                    template = Template(
+                        name=template_name,
+                        collection_id=collection.id,
+                        cost=state_cost_estimate(parameters).cost,
+                    )
                 session.add(template)
-
-            entities = []
-
-            for name, value in parameters.items():
-                if name in existing_parameters:
-                    # TODO: allow to update parameters, for now just skip
-                    logger.warning(f"Parameter {name} already exists, skipping.")
-                    continue
-                if isinstance(value, list):
-                    for v in value:
-                        entities.append(
-                            TemplateParameter(name=name, value=v, template=template)
-                        )
-                else:
-                    entities.append(
-                        TemplateParameter(name=name, value=value, template=template)
+                session.flush()
+
+                rows = []
+                for name, value in parameters.items():
+                    if name in existing_names:
+                        # TODO: allow to update parameters, for now just skip
+                        logger.warning(f"Parameter {name} already exists, skipping.")
+                        continue
+                    values = value if isinstance(value, list) else [value]
+                    rows.extend(
+                        {"template_id": template.id, "name": name, "value": v}
+                        for v in values
                     )
-
-            session.add_all(entities)
-            session.commit()
+                insert_parameters(session, rows)
+            session.refresh(template, ["parameters"])
         return template, session
 
     def fetch_sub_templates(self, prefix: str = "sub") -> List[Template]:
         sub_template_prefix = f"{prefix}_{self.template_name}_"
-        with self._session as session:
-            return list(
-                session.exec(
-                    select(Template).where(
-                        col(Template.name).like(f"{sub_template_prefix}%")
-                    )
-                )
-            )
-
-
-drop_existing = os.getenv("DROP_EXISTING", "false").lower() == "true"
-create_db_and_tables(drop_existing=drop_existing)
+        session = self._session
+        query = select(Template).where(col(Template.name) >= sub_template_prefix)
+        upper_bound = prefix_upper_bound(sub_template_prefix)
+        if upper_bound is not None:
+            query = query.where(col(Template.name) < upper_bound)
+        return session.exec(query).all()
@@ -1,232 +1,325 @@
 
-from typing import List
+import json
+from typing import Dict, Final, List
 from contextlib import contextmanager
 import logging
+import threading
 import duckdb
 
-from storage.datasets import connect_to_database
-from .models import SingleArrayVariable, SingleEnumVariable
+from . import pool
+from .models import StacVariable
 from .exceptions import STACDatabaseError
 
 logger = logging.getLogger(__name__)
 
+# costings tables, each with its `seq_<table>_id` sequence, dependents first
+TABLES = (
+    "stac_template_history",
+    "stac_templates",
+    "stac_constraints",
+    "stac_input_parameters",
+    "stac_input_values",
+    "stac_input_schemas",
+)
+
+# set once the costings tables are known to exist, skips the check afterwards
+_tables_ready = False
+_tables_lock = threading.Lock()
+
+
+def _invalidate_tables_cache():
+    """Check the costings tables again on the next `_ensure_tables_exist` call."""
+    global _tables_ready
+    _tables_ready = False
+
 
 def _ensure_tables_exist():
     """Ensure costings tables exist, create them if they don't."""
+    global _tables_ready
+    if _tables_ready:
+        return
+    with _tables_lock:
+        if _tables_ready:
+            return
+        _check_tables_exist()
+
+
+def _check_tables_exist():
+    """Look the costings tables up in the catalog, create them if missing."""
+    global _tables_ready
     try:
-        con = connect_to_database()
-        try:
+        with get_database_connection() as con:
             # Check if stac_input_parameters table exists using DuckDB syntax
             result = con.execute("""
-                SELECT table_name 
-                FROM information_schema.tables 
+                SELECT 1
+                FROM duckdb_tables()
                 WHERE table_name = 'stac_input_parameters'
+                LIMIT 1
             """).fetchone()
-            
-            if not result:
-                logger.info("Costings tables not found, creating them...")
-                con.close()  # Close before calling initialize
-                initialize_costings_tables()
-                return
-                
-            # If input parameters table exists, assume all costings tables exist
-            logger.debug("Costings tables already exist")
-        finally:
-            con.close()
-            
+
+        if not result:
+            logger.info("Costings tables not found, creating them...")
+            initialize_costings_tables()
+            return
+
+        # If input parameters table exists, assume all costings tables exist
+        logger.debug("Costings tables already exist")
+        _tables_ready = True
+
     except Exception as e:
-        logger.warning(f"Could not check table existence, attempting to create: {e}")
+        logger.warning("Could not check table existence, attempting to create: %s", e)
         try:
             initialize_costings_tables()
         except Exception as init_error:
-            logger.error(f"Failed to initialize costings tables: {init_error}")
+            logger.error("Failed to initialize costings tables: %s", init_error)
             raise STACDatabaseError(f"Cannot initialize required tables: {init_error}") from init_error
 
 
+# statements leaving something to commit, any other one is a read
+_WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "CREATE", "DROP", "ALTER", "BEGIN")
+
+
+class _TxConnection:
+    """Proxy to a pooled connection, recording whether it issued any write."""
+
+    def __init__(self, con: duckdb.DuckDBPyConnection):
+        self._con = con
+        self.dirty = False
+
+    def _track(self, query: str | duckdb.Statement):
+        if self.dirty:
+            return
+        if isinstance(query, duckdb.Statement):
+            self.dirty = query.type != duckdb.StatementType.SELECT
+        else:
+            self.dirty = query.lstrip().upper().startswith(_WRITE_STATEMENTS)
+
+    def execute(self, query: str | duckdb.Statement, *args, **kwargs):
+        self._track(query)
+        return self._con.execute(query, *args, **kwargs)
+
+    def executemany(self, query: str | duckdb.Statement, *args, **kwargs):
+        self._track(query)
+        return self._con.executemany(query, *args, **kwargs)
+
+    def begin(self):
+        self.dirty = True
+        return self._con.begin()
+
+    def __getattr__(self, name: str):
+        return getattr(self._con, name)
+
+
 @contextmanager
 def get_database_connection():
-    """Context manager for database connections with proper error handling."""
+    """Context manager for pooled database connections with proper error handling.
+
+    The connection goes back to the pool on exit, it is never closed. It is only
+    committed when a write went through it, read-only blocks skip the commit.
+    """
     con = None
     try:
-        con = connect_to_database()
-        yield con
-        con.commit()
+        con = pool.acquire()
+        proxy = _TxConnection(con)
+        yield proxy
+        if proxy.dirty:
+            con.commit()
     except Exception as e:
         if con:
             try:
                 con.rollback()
             except Exception as rollback_error:
-                logger.debug(f"Rollback failed (may be normal): {rollback_error}")
-        logger.error(f"Database operation failed: {e}")
+                logger.debug("Rollback failed (may be normal): %s", rollback_error)
+        logger.error("Database operation failed: %s", e)
         raise STACDatabaseError(f"Database operation failed: {e}") from e
     finally:
         if con:
-            con.close()
+            pool.release(con)
+
+# parsed statements by SQL text, they are not bound to the connection parsing them
+_statements: Dict[str, duckdb.Statement] = {}
+
+
+def exec_cached(con: duckdb.DuckDBPyConnection, sql: str, params=None, many: bool = False):
+    """Execute a single-statement `sql`, parsing it only on its first use in the process."""
+    statement = _statements.get(sql)
+    if statement is None:
+        statement = _statements[sql] = con.extract_statements(sql)[0]
+    if many:
+        return con.executemany(statement, params)
+    return con.execute(statement, params)
+
+
+def drop_table_sql(table_name: str) -> str:
+    """Statements dropping a table and its associated sequence."""
+    return f"DROP TABLE IF EXISTS {table_name}; DROP SEQUENCE IF EXISTS seq_{table_name}_id"
+
 
 def drop_table(table_name: str, con: duckdb.DuckDBPyConnection):
     """Drop a table and its associated sequences."""
-    con.execute(f"DROP TABLE IF EXISTS {table_name}")
-    con.execute(f"DROP SEQUENCE IF EXISTS seq_{table_name}_id")
+    con.execute(drop_table_sql(table_name))
     
-def create_sequence(table_name: str, con: duckdb.DuckDBPyConnection):
-    """Create a sequence for a table."""
-    con.execute(f"CREATE SEQUENCE seq_{table_name}_id START 1")
+
+_DROP_SQL: Final[str] = ";\n".join(drop_table_sql(table_name) for table_name in TABLES)
+
+# Sequences for auto-incrementing IDs, tables, then indexes, run as one script
+_INIT_SQL: Final[str] = ";\n".join([
+    *(
+        f"CREATE SEQUENCE IF NOT EXISTS seq_{table_name}_id START 1"
+        for table_name in TABLES
+    ),
+    """
+    CREATE TABLE IF NOT EXISTS stac_input_values (
+        id INTEGER PRIMARY KEY DEFAULT nextval('seq_stac_input_values_id'),
+        input_parameter_id INTEGER NOT NULL,
+        value VARCHAR NOT NULL,
+        discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(input_parameter_id, value)
+    )
+    """,
+    # Create constraints table with indexes
+    """
+    CREATE TABLE IF NOT EXISTS stac_constraints (
+        id INTEGER PRIMARY KEY DEFAULT nextval('seq_stac_constraints_id'),
+        collection_id TEXT NOT NULL,
+        constraint_set_id TEXT NOT NULL,
+        variables TEXT,
+        daily_statistics TEXT,
+        frequencies TEXT,
+        time_zones TEXT,
+        years TEXT,
+        months TEXT,
+        days TEXT,
+        product_types TEXT,
+        discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(collection_id, constraint_set_id)
+    )
+    """,
+    # Create input schemas table for storing dataset input specifications
+    """
+    CREATE TABLE IF NOT EXISTS stac_input_schemas (
+        id INTEGER PRIMARY KEY DEFAULT nextval('seq_stac_input_schemas_id'),
+        collection_id TEXT NOT NULL UNIQUE,
+        schema_data TEXT NOT NULL,
+        discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Create input parameters table for individual parameter details
+    """
+    CREATE TABLE IF NOT EXISTS stac_input_parameters (
+        id INTEGER PRIMARY KEY DEFAULT nextval('seq_stac_input_parameters_id'),
+        collection_id TEXT NOT NULL,
+        parameter_name TEXT NOT NULL,
+        title TEXT NOT NULL,
+        schema_type TEXT NOT NULL,
+        items_type TEXT,
+        enum_values TEXT,
+        required BOOLEAN DEFAULT FALSE,
+        description TEXT,
+        discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(collection_id, parameter_name)
+    )
+    """,
+    # Create templates table with constraints
+    """
+    CREATE TABLE IF NOT EXISTS stac_templates (
+        id INTEGER PRIMARY KEY DEFAULT nextval('seq_stac_templates_id'),
+        template_name TEXT UNIQUE NOT NULL,
+        collection_id TEXT NOT NULL,
+        template_data TEXT NOT NULL,
+        variables TEXT,
+        estimated_cost REAL CHECK (estimated_cost >= 0),
+        budget_limit REAL DEFAULT 400.0 CHECK (budget_limit > 0),
+        is_within_budget BOOLEAN,
+        is_valid BOOLEAN,
+        validation_errors TEXT,
+        constraint_set_id TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Create template history table
+    """
+    CREATE TABLE IF NOT EXISTS stac_template_history (
+        id INTEGER PRIMARY KEY DEFAULT nextval('seq_stac_template_history_id'),
+        template_id INTEGER NOT NULL,
+        action TEXT NOT NULL CHECK (action IN ('create', 'update', 'validate', 'estimate', 'optimize')),
+        old_data TEXT,
+        new_data TEXT,
+        cost_estimate REAL CHECK (cost_estimate >= 0),
+        validation_result TEXT,
+        performed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Create indexes for better performance
+    # stac_input_parameters lookups use the index of its composite UNIQUE
+    # constraint, the former single-column indexes are dropped
+    "DROP INDEX IF EXISTS idx_input_parameters_collection",
+    "DROP INDEX IF EXISTS idx_input_parameters_title",
+    "CREATE INDEX IF NOT EXISTS idx_input_values_input_parameter ON stac_input_values(input_parameter_id)",
+    "CREATE INDEX IF NOT EXISTS idx_input_values_value ON stac_input_values(value)",
+    "CREATE INDEX IF NOT EXISTS idx_constraints_collection ON stac_constraints(collection_id)",
+    "CREATE INDEX IF NOT EXISTS idx_templates_collection ON stac_templates(collection_id)",
+    "CREATE INDEX IF NOT EXISTS idx_templates_valid ON stac_templates(is_valid)",
+    "CREATE INDEX IF NOT EXISTS idx_templates_budget ON stac_templates(is_within_budget)",
+    "CREATE INDEX IF NOT EXISTS idx_history_template ON stac_template_history(template_id)",
+])
 
 
 def initialize_costings_tables(drop_existing: bool = False):
-    """Initialize the costings-related tables in the database."""
+    """Initialize the costings-related tables in the database.
+
+    Every statement is `IF NOT EXISTS`, so initializing an existing database is
+    a no-op. `drop_existing` wipes the tables and their data first.
+    """
+    global _tables_ready
+    if pool.read_only:
+        raise STACDatabaseError("Cannot initialize costings tables in a read-only database")
+    _invalidate_tables_cache()
     try:
-        con = connect_to_database()
-        try:
+        with get_database_connection() as con:
             if drop_existing:
-                drop_table("stac_template_history", con)
-                drop_table("stac_templates", con)
-                drop_table("stac_constraints", con)
-                drop_table("stac_input_parameters", con)
-                drop_table("stac_input_values", con)
-            
-            # Create sequences for auto-incrementing IDs
-            create_sequence("stac_input_parameters", con)
-            create_sequence("stac_input_values", con)
-            create_sequence("stac_constraints", con)
-            create_sequence("stac_templates", con)
-            create_sequence("stac_template_history", con)
-            
-            # Create input parameters table with indexes
-            con.execute("""
-                CREATE TABLE stac_input_parameters (
-                    id INTEGER PRIMARY KEY DEFAULT nextval('seq_stac_input_parameters_id'),
-                    collection_id TEXT NOT NULL,
-                    title TEXT NOT NULL,
-                    discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(collection_id, title)
-                )
-            """)
-
-            con.execute("""
-                CREATE TABLE stac_input_values (
-                    id INTEGER PRIMARY KEY DEFAULT nextval('seq_stac_input_values_id'),
-                    input_parameter_id INTEGER NOT NULL,
-                    value VARCHAR NOT NULL,
-                    discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(input_parameter_id, value)
-                )
-            """)
-            
-            # Create constraints table with indexes
-            con.execute("""
-                CREATE TABLE stac_constraints (
-                    id INTEGER PRIMARY KEY DEFAULT nextval('seq_stac_constraints_id'),
-                    collection_id TEXT NOT NULL,
-                    constraint_set_id TEXT NOT NULL,
-                    variables TEXT,
-                    daily_statistics TEXT,
-                    frequencies TEXT,
-                    time_zones TEXT,
-                    years TEXT,
-                    months TEXT,
-                    days TEXT,
-                    product_types TEXT,
-                    discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(collection_id, constraint_set_id)
-                )
-            """)
-            
-            # Create input schemas table for storing dataset input specifications
-            con.execute("""
-                CREATE TABLE stac_input_schemas (
-                    id INTEGER PRIMARY KEY DEFAULT nextval('seq_stac_input_schemas_id'),
-                    collection_id TEXT NOT NULL UNIQUE,
-                    schema_data TEXT NOT NULL,
-                    discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Create input parameters table for individual parameter details
-            con.execute("""
-                CREATE TABLE stac_input_parameters (
-                    id INTEGER PRIMARY KEY DEFAULT nextval('seq_stac_input_parameters_id'),
-                    collection_id TEXT NOT NULL,
-                    parameter_name TEXT NOT NULL,
-                    title TEXT NOT NULL,
-                    schema_type TEXT NOT NULL,
-                    items_type TEXT,
-                    enum_values TEXT,
-                    required BOOLEAN DEFAULT FALSE,
-                    description TEXT,
-                    discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(collection_id, parameter_name)
-                )
-            """)
-            
-            # Create templates table with constraints
-            con.execute("""
-                CREATE TABLE stac_templates (
-                    id INTEGER PRIMARY KEY DEFAULT nextval('seq_stac_templates_id'),
-                    template_name TEXT UNIQUE NOT NULL,
-                    collection_id TEXT NOT NULL,
-                    template_data TEXT NOT NULL,
-                    variables TEXT,
-                    estimated_cost REAL CHECK (estimated_cost >= 0),
-                    budget_limit REAL DEFAULT 400.0 CHECK (budget_limit > 0),
-                    is_within_budget BOOLEAN,
-                    is_valid BOOLEAN,
-                    validation_errors TEXT,
-                    constraint_set_id TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Create template history table
-            con.execute("""
-                CREATE TABLE stac_template_history (
-                    id INTEGER PRIMARY KEY DEFAULT nextval('seq_stac_template_history_id'),
-                    template_id INTEGER NOT NULL,
-                    action TEXT NOT NULL CHECK (action IN ('create', 'update', 'validate', 'estimate', 'optimize')),
-                    old_data TEXT,
-                    new_data TEXT,
-                    cost_estimate REAL CHECK (cost_estimate >= 0),
-                    validation_result TEXT,
-                    performed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Create indexes for better performance
-            indexes = [
-                "CREATE INDEX IF NOT EXISTS idx_input_parameters_collection ON stac_input_parameters(collection_id)",
-                "CREATE INDEX IF NOT EXISTS idx_input_parameters_title ON stac_input_parameters(title)",
-                "CREATE INDEX IF NOT EXISTS idx_input_values_input_parameter ON stac_input_values(input_parameter_id)",
-                "CREATE INDEX IF NOT EXISTS idx_input_values_value ON stac_input_values(value)",
-                "CREATE INDEX IF NOT EXISTS idx_constraints_collection ON stac_constraints(collection_id)",
-                "CREATE INDEX IF NOT EXISTS idx_templates_collection ON stac_templates(collection_id)",
-                "CREATE INDEX IF NOT EXISTS idx_templates_valid ON stac_templates(is_valid)",
-                "CREATE INDEX IF NOT EXISTS idx_templates_budget ON stac_templates(is_within_budget)",
-                "CREATE INDEX IF NOT EXISTS idx_history_template ON stac_template_history(template_id)",
-            ]
-            
-            for index_sql in indexes:
-                con.execute(index_sql)
-            
-            con.commit()
-            logger.info("Costings tables initialized successfully")
-        finally:
-            con.close()
-            
+                con.execute(_DROP_SQL)
+            # a single transaction, a failing statement leaves no partial schema
+            con.begin()
+            con.execute(_INIT_SQL)
+
+        _tables_ready = True
+        logger.info("Costings tables initialized successfully")
+
     except Exception as e:
-        logger.error(f"Failed to initialize costings tables: {e}")
+        logger.error("Failed to initialize costings tables: %s", e)
         raise STACDatabaseError(f"Failed to initialize costings tables: {e}") from e
 
-def store_input_parameters(collection_id: str, input_parameters: List[SingleArrayVariable | SingleEnumVariable]) -> None:
-    """Store input parameters for a collection."""
-    con = connect_to_database()
-    for input_parameter in input_parameters:
-        con.execute("""
-            INSERT INTO stac_input_parameters (collection_id, title, schema_type, items_type, enum_values, required, description) VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (collection_id, input_parameter.title, input_parameter.schema_type, input_parameter.items_type, input_parameter.enum_values, input_parameter.required, input_parameter.description))
-    con.commit()
-    con.close()
+def _input_parameter_row(input_parameter: StacVariable) -> tuple:
+    """Flatten an input parameter into a `stac_input_parameters` row, minus its collection."""
+    is_enum = input_parameter.kind == "enum"
+    return (
+        input_parameter.name,
+        input_parameter.title,
+        input_parameter.type if is_enum else "array",
+        None if is_enum else input_parameter.type,
+        json.dumps(input_parameter.values),
+    )
+
+
+def store_input_parameters(collection_id: str, input_parameters: List[StacVariable]) -> None:
+    """Store input parameters for a collection.
+
+    Values are handed over column by column, as one list per column unnested by
+    DuckDB, rather than converted row by row.
+    """
+    if not input_parameters:
+        return
+    columns = [list(column) for column in zip(*map(_input_parameter_row, input_parameters))]
+    with get_database_connection() as con:
+        # one transaction for the whole batch, committed or rolled back on exit
+        con.begin()
+        exec_cached(con, """
+            INSERT INTO stac_input_parameters (collection_id, parameter_name, title, schema_type, items_type, enum_values)
+            SELECT ?, unnest(?::VARCHAR[]), unnest(?::VARCHAR[]), unnest(?::VARCHAR[]), unnest(?::VARCHAR[]), unnest(?::VARCHAR[])
+        """, [collection_id, *columns])
 
 # # Template Operations
 # def create_template(template: Template) -> int:
@@ -2,7 +2,11 @@
 Custom exceptions for the STAC module.
 """
 
-from typing import Optional, Dict, Any
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Mapping
+
+# shared by exceptions raised without details, read-only: copy it before adding keys
+_EMPTY_DETAILS: Mapping[str, Any] = MappingProxyType({})
 
 
 class STACError(Exception):
@@ -11,7 +15,7 @@ class STACError(Exception):
     def __init__(self, message: str, details: Optional[Dict[str, Any]] = None):
         super().__init__(message)
         self.message = message
-        self.details = details or {}
+        self.details = details if details else _EMPTY_DETAILS
 
 
 class STACValidationError(STACError):
@@ -1,20 +1,40 @@
 from collections import Counter
-import json
 import enum
+import re
 from math import prod
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
+from functools import lru_cache
 from pydantic import computed_field
+from sqlalchemy import (
+    Index,
+    String,
+    UniqueConstraint,
+    bindparam,
+    delete,
+    func,
+    insert,
+    lambda_stmt,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlmodel import SQLModel, Relationship, Enum, Column, Field, JSON, select, Session
-from sqlmodel.sql.expression import SelectOfScalar
+from sqlalchemy.sql.lambdas import StatementLambdaElement
 import logging
-from typing import Optional, Dict, Any, List, Literal, TypedDict, Union
+from typing import Optional, Dict, Any, List, Literal, Tuple
 from datetime import datetime
 
+from . import serialization
+
 logger = logging.getLogger(__name__)
 
 retrieve_url_pattern = (
     r"https://cds.climate.copernicus.eu/api/retrieve/v1/processes/{dataset_id}"
 )
+_retrieve_prefix, _, _retrieve_suffix = retrieve_url_pattern.partition("{dataset_id}")
+# native text arrays on PostgreSQL, decoded without a JSON parse
+string_array_type = JSON().with_variant(ARRAY(String), "postgresql")
+# binary JSON on PostgreSQL, elsewhere text encoded by the engine's serializer
+json_type = JSON().with_variant(JSONB(), "postgresql")
 
 
 class CatalogRelType(enum.Enum):
@@ -55,7 +75,7 @@ ArrayType = Literal["array"]
 ## DATACLASSES
 
 
-@dataclass
+@dataclass(slots=True)
 class StacLink:
     rel: CollectionRelType
     href: str
@@ -72,7 +92,7 @@ class StacLink:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class StacCollection:
     id: str
     title: str
@@ -90,8 +110,8 @@ class StacCollection:
             id=data["id"],
             title=data["title"],
             description=data["description"],
-            created_at=datetime.fromisoformat(data["published"]),
-            updated_at=datetime.fromisoformat(data["updated"]),
+            created_at=serialization.parse_datetime(data["published"]),
+            updated_at=serialization.parse_datetime(data["updated"]),
             doi=data.get("doi", None),
             links=[StacLink.from_dict(link) for link in data["links"]],
             keywords=data.get("keywords", []),
@@ -109,7 +129,7 @@ class StacCollection:
         return retrieve
 
 
-@dataclass
+@dataclass(slots=True)
 class StacRetrieve:
     title: str
     description: str
@@ -132,8 +152,35 @@ class StacRetrieve:
 ## MODELS
 
 
+def created_at_field() -> Any:
+    """Creation timestamp, filled in by the database on insert."""
+    return Field(
+        default=None,
+        description="Creation timestamp",
+        sa_column_kwargs={"server_default": func.now(), "nullable": False},
+    )
+
+
+def updated_at_field() -> Any:
+    """Last update timestamp, filled in by the database on insert and update.
+
+    Models using it set `eager_defaults`, so that the new value is fetched back
+    with `RETURNING` instead of being expired by each update.
+    """
+    return Field(
+        default=None,
+        description="Last update timestamp",
+        sa_column_kwargs={
+            "server_default": func.now(),
+            "onupdate": func.now(),
+            "nullable": False,
+        },
+    )
+
+
 class CatalogLink(SQLModel, table=True):
     __tablename__ = "catalog_link"
+    __mapper_args__ = {"eager_defaults": True}
     id: Optional[int] = Field(default=None, primary_key=True)
     collection_url: str = Field(..., description="Collection URL", unique=True)
     rel: CatalogRelType = Field(
@@ -142,42 +189,34 @@ class CatalogLink(SQLModel, table=True):
     )
     title: Optional[str] = Field(None, description="Collection title")
     mime_type: Optional[str] = Field(None, description="MIME type of the collection")
-    created_at: datetime = Field(
-        ..., description="Creation timestamp", default_factory=datetime.now
-    )
-    updated_at: datetime = Field(
-        ..., description="Last update timestamp", default_factory=datetime.now
-    )
+    created_at: Optional[datetime] = created_at_field()
+    updated_at: Optional[datetime] = updated_at_field()
 
 
 class Collection(SQLModel, table=True):
     __tablename__ = "collection"
+    __mapper_args__ = {"eager_defaults": True}
     id: Optional[int] = Field(default=None, primary_key=True)
     # TODO: disambiguate this vs collection.id FK in other tables, maybe call it dataset_id ?
-    collection_id: str = Field(..., description="Collection identifier")
+    collection_id: str = Field(
+        ..., description="Collection identifier", index=True, unique=True
+    )
     title: str = Field(..., description="Collection title")
     description: str = Field(..., description="Collection description")
-    created_at: datetime = Field(
-        ..., description="Creation timestamp", default_factory=datetime.now
-    )
-    updated_at: datetime = Field(
-        ..., description="Last update timestamp", default_factory=datetime.now
-    )
+    created_at: Optional[datetime] = created_at_field()
+    updated_at: Optional[datetime] = updated_at_field()
     doi: Optional[str] = Field(None, description="DOI of the collection")
 
     keywords: List["Keyword"] = Relationship(
         back_populates="collection",
-        sa_relationship_kwargs={"lazy": "selectin"},
         cascade_delete=True,
     )
     links: List["CollectionLink"] = Relationship(
         back_populates="collection",
-        sa_relationship_kwargs={"lazy": "selectin"},
         cascade_delete=True,
     )
     input_schema: Optional["InputSchema"] = Relationship(
         back_populates="collection",
-        sa_relationship_kwargs={"lazy": "selectin"},
         cascade_delete=True,
     )
 
@@ -187,11 +226,71 @@ class Collection(SQLModel, table=True):
             collection_id=data["id"],
             title=data["title"],
             description=data["description"],
-            created_at=datetime.fromisoformat(data["published"]),
-            updated_at=datetime.fromisoformat(data["updated"]),
+            created_at=serialization.parse_datetime(data["published"]),
+            updated_at=serialization.parse_datetime(data["updated"]),
             doi=data.get("doi", None),
         )
 
+    @classmethod
+    def bulk_upsert(
+        cls, session: Session, collections: List[StacCollection]
+    ) -> List["Collection"]:
+        """Upsert fetched collections, with their keywords and links.
+
+        Collections are inserted, or updated when their `collection_id` exists,
+        with a single executemany returning them. Their links are then replaced
+        with one executemany, and their keywords synced with `Keyword.sync`.
+        Nothing is committed.
+        """
+        if not collections:
+            return []
+        rows = [
+            {
+                "collection_id": data.id,
+                "title": data.title,
+                "description": data.description,
+                "created_at": data.created_at,
+                "updated_at": data.updated_at,
+                "doi": data.doi,
+            }
+            for data in collections
+        ]
+        upsert = sqlite_insert(cls)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=["collection_id"],
+            set_={
+                name: upsert.excluded[name]
+                for name in ("title", "description", "updated_at", "doi")
+            },
+        ).returning(cls, sort_by_parameter_order=True)
+        instances = session.scalars(
+            upsert, rows, execution_options={"populate_existing": True}
+        ).all()
+        ids = [instance.id for instance in instances]
+        session.execute(
+            delete(CollectionLink).where(CollectionLink.collection_id.in_(ids))
+        )
+        keywords = {}
+        link_rows = []
+        for instance, data in zip(instances, collections):
+            keywords[instance.id] = data.keywords
+            link_rows.extend(
+                {
+                    "collection_id": instance.id,
+                    "url": link.href,
+                    "rel": link.rel,
+                    "mime_type": link.mime_type,
+                    "title": link.title,
+                }
+                for link in data.links
+                if link.rel != "self"
+            )
+            session.expire(instance, ["keywords", "links"])
+        Keyword.sync(session, keywords)
+        if link_rows:
+            session.execute(insert(CollectionLink), link_rows)
+        return list(instances)
+
     @classmethod
     def from_stac_collection(cls, collection: StacCollection) -> "Collection":
         instance = cls(
@@ -204,7 +303,7 @@ class Collection(SQLModel, table=True):
         )
         keywords = [
             Keyword(keyword=keyword, collection=instance)
-            for keyword in collection.keywords
+            for keyword in dict.fromkeys(collection.keywords)
         ]
         instance.keywords.extend(keywords)
         links = [
@@ -222,27 +321,65 @@ class Collection(SQLModel, table=True):
 
     @property
     def retrieve_url(self) -> str:
-        return retrieve_url_pattern.format(dataset_id=self.collection_id)
+        return _retrieve_prefix + self.collection_id + _retrieve_suffix
 
 
 class Keyword(SQLModel, table=True):
     __tablename__ = "keyword"
+    __table_args__ = (
+        Index("ix_keyword_collection_id_keyword", "collection_id", "keyword"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     id: Optional[int] = Field(default=None, primary_key=True)
     collection_id: int = Field(default=None, foreign_key="collection.id")
     keyword: str = Field(..., description="Keyword")
-    created_at: datetime = Field(
-        ..., description="Creation timestamp", default_factory=datetime.now
-    )
-    updated_at: datetime = Field(
-        ..., description="Last update timestamp", default_factory=datetime.now
-    )
-    collection: Optional[Collection] = Relationship(
-        back_populates="keywords", sa_relationship_kwargs={"lazy": "selectin"}
-    )
+    created_at: Optional[datetime] = created_at_field()
+    updated_at: Optional[datetime] = updated_at_field()
+    collection: Optional[Collection] = Relationship(back_populates="keywords")
+
+    @classmethod
+    def sync(cls, session: Session, keywords: Dict[int, List[str]]):
+        """Make the keywords of each collection id match the given ones.
+
+        Keywords already stored are kept, only the missing ones are inserted,
+        and stale or duplicated rows deleted, with one statement each.
+        """
+        if not keywords:
+            return
+        wanted = {
+            (collection_id, keyword)
+            for collection_id, names in keywords.items()
+            for keyword in names
+        }
+        kept = set()
+        stale_ids = []
+        for keyword_id, collection_id, keyword in session.execute(
+            select(cls.id, cls.collection_id, cls.keyword).where(
+                cls.collection_id.in_(list(keywords))
+            )
+        ):
+            pair = (collection_id, keyword)
+            if pair in wanted and pair not in kept:
+                kept.add(pair)
+            else:
+                stale_ids.append(keyword_id)
+        if stale_ids:
+            session.execute(delete(cls).where(cls.id.in_(stale_ids)))
+        rows = []
+        for collection_id, names in keywords.items():
+            for keyword in dict.fromkeys(names):
+                if (collection_id, keyword) not in kept:
+                    rows.append({"collection_id": collection_id, "keyword": keyword})
+        if rows:
+            session.execute(insert(cls), rows)
 
 
 class CollectionLink(SQLModel, table=True):
     __tablename__ = "collection_link"
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        Index("ix_collection_link_collection_id_rel", "collection_id", "rel"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     collection_id: int = Field(default=None, foreign_key="collection.id")
     url: str = Field(..., description="URL of the collection link")
@@ -254,183 +391,166 @@ class CollectionLink(SQLModel, table=True):
         None, description="MIME type of the collection link"
     )
     title: Optional[str] = Field(None, description="Title of the collection link")
-    created_at: datetime = Field(
-        ..., description="Creation timestamp", default_factory=datetime.now
-    )
+    created_at: Optional[datetime] = created_at_field()
 
-    collection: Optional[Collection] = Relationship(
-        back_populates="links", sa_relationship_kwargs={"lazy": "selectin"}
-    )
-
-
-class StacEnumType(TypedDict):
-    type: VariableType
-    enum: List[str]
-
-
-class StacArrayType(TypedDict):
-    type: ArrayType
-    items: StacEnumType
-
-
-@dataclass
-class SingleEnumVariable:
-    title: str
-    name: str
-    schema: StacEnumType
-    choice: str = "one_or_many"
+    collection: Optional[Collection] = Relationship(back_populates="links")
 
-    @property
-    def type(self) -> VariableType:
-        return self.schema["type"]
 
-    @property
-    def values(self) -> List[str]:
-        return self.schema["enum"]
+VariableKind = Literal["enum", "array", "number"]
 
 
-@dataclass
-class SingleArrayVariable:
+@dataclass(slots=True, frozen=True)
+class StacVariable:
     """
-    A variable that can take many values, possible choices are stored as array of strings.
+    An input variable of a dataset, flattened from its JSON schema by `infer_type`.
+
+    `kind` tells the schema shape apart: a single `enum`, an `array` whose items
+    are an enum of strings, or a `number` array (not to be confused with an
+    enum array, its `values` are the schema defaults).
+    `values` is a tuple, so each `input_parameter` row gets its own list copy.
     """
 
+    kind: VariableKind
     title: str
     name: str
-    schema: StacArrayType
+    type: VariableType
+    values: Tuple[Any, ...]
     choice: str = "one_or_many"
 
-    @property
-    def items(self) -> StacEnumType:
-        return self.schema["items"]
-
-    @property
-    def values(self) -> List[str]:
-        return self.items["enum"]
-
-    @property
-    def type(self) -> VariableType:
-        return self.items["type"]
-
 
-@dataclass
-class NumberArrayVariable:
-    """
-    A variable that is an array of numbers. Not to be confused with a variable that has multiple allowed
-    values, documented in the schema as an enum array.
-    """
+def _enum_variable(name: str, title: str, schema: Dict[str, Any]) -> StacVariable:
+    return StacVariable(
+        "enum", title, name, type=schema["type"], values=tuple(schema["enum"])
+    )
 
-    title: str
-    name: str
-    schema: StacArrayType
-    choice: str = "one"
 
-    @property
-    def values(self) -> List[float]:
-        return self.schema["default"]
+def _number_variable(name: str, title: str, schema: Dict[str, Any]) -> StacVariable:
+    return StacVariable(
+        "number",
+        title,
+        name,
+        type=schema["items"]["type"],
+        values=tuple(schema["default"]),
+        choice="one",
+    )
 
-    @property
-    def type(self) -> VariableType:
-        return self.schema["items"]["type"]
 
-    @property
-    def dimensions(self) -> List[str]:
-        return [self.schema["minItems"], self.schema["maxItems"]]
+def _array_variable(name: str, title: str, schema: Dict[str, Any]) -> StacVariable:
+    items = schema["items"]
+    return StacVariable(
+        "array", title, name, type=items["type"], values=tuple(items["enum"])
+    )
 
 
-StacVariable = Union[SingleArrayVariable, SingleEnumVariable, NumberArrayVariable]
+# the first key found in a schema picks the variable builder
+_VARIABLE_BUILDERS = (
+    ("enum", _enum_variable),
+    ("default", _number_variable),
+    ("items", _array_variable),
+)
 
 
 def infer_type(name: str, json_schema: Dict[str, Any]) -> StacVariable:
-    if "schema" in json_schema:
-        if "enum" in json_schema["schema"]:
-            return SingleEnumVariable(
-                name=name, title=json_schema["title"], schema=json_schema["schema"]
-            )
-        elif "default" in json_schema["schema"]:
-            return NumberArrayVariable(
-                name=name, title=json_schema["title"], schema=json_schema["schema"]
-            )
-        elif "items" in json_schema["schema"]:
-            return SingleArrayVariable(
-                name=name, title=json_schema["title"], schema=json_schema["schema"]
-            )
-        else:
-            raise ValueError("Unsupported input data", json_schema)
-    raise ValueError("Invalid input data", json_schema)
+    schema = json_schema.get("schema")
+    if schema is None:
+        raise ValueError("Invalid input data", json_schema)
+    for key, build in _VARIABLE_BUILDERS:
+        if key in schema:
+            return build(name, json_schema["title"], schema)
+    raise ValueError("Unsupported input data", json_schema)
 
 
-def parse_dataset_inputs(
-    json_data: Dict[str, Any],
-) -> List[SingleArrayVariable | SingleEnumVariable]:
+def parse_dataset_inputs(json_data: Dict[str, Any]) -> List[StacVariable]:
     """Parse the dataset inputs from the JSON data.
 
     Args:
         json_data: The JSON data to parse. Usually, the values of the "inputs" key of the response data.
 
     Returns:
-        A list of SingleArrayVariable or SingleEnumVariable objects.
+        A list of StacVariable objects.
     """
+    debug = logger.isEnabledFor(logging.DEBUG)
     inputs = []
     for name, value in json_data.items():
-        logger.info(f"Parsing input {name} with value {value}")
+        if debug:
+            logger.debug("Parsing input %s with value %s", name, value)
         inputs.append(infer_type(name, value))
     return inputs
 
 
 class InputSchema(SQLModel, table=True):
     __tablename__ = "input_schema"
+    __mapper_args__ = {"eager_defaults": True}
     id: Optional[int] = Field(default=None, primary_key=True)
     collection_id: int = Field(
-        ..., foreign_key="collection.id", description="Collection identifier"
-    )
-    created_at: datetime = Field(
-        ..., description="Creation timestamp", default_factory=datetime.now
-    )
-    updated_at: datetime = Field(
-        ..., description="Last update timestamp", default_factory=datetime.now
+        ...,
+        foreign_key="collection.id",
+        description="Collection identifier",
+        index=True,
     )
+    created_at: Optional[datetime] = created_at_field()
+    updated_at: Optional[datetime] = updated_at_field()
 
-    collection: Optional["Collection"] = Relationship(
-        back_populates="input_schema", sa_relationship_kwargs={"lazy": "selectin"}
-    )
+    collection: Optional["Collection"] = Relationship(back_populates="input_schema")
     parameters: List["InputParameter"] = Relationship(
         back_populates="input_schema",
-        sa_relationship_kwargs={"lazy": "selectin"},
         cascade_delete=True,
     )
     schema_constraints: Optional["SchemaConstraints"] = Relationship(
         back_populates="input_schema",
-        sa_relationship_kwargs={"lazy": "selectin"},
         cascade_delete=True,
     )
 
     @classmethod
     def create_with_parameters(
-        cls, response_data: Dict[str, Any], collection: Collection
-    ):
-        """Create an input schema with parameters from the response data."""
-        if "inputs" in response_data:
-            inputs = response_data["inputs"]
-        else:
-            inputs = response_data
-
-        input_schema = cls(collection=collection)
-        for input_var in parse_dataset_inputs(inputs):
-            input_schema.parameters.append(
-                InputParameter(
-                    title=input_var.title,
-                    name=input_var.name,
-                    type=input_var.type,
-                    values=input_var.values,
-                    choice=input_var.choice,
-                )
+        cls,
+        response_data: Dict[str, Any],
+        collection: Collection,
+        session: Optional[Session] = None,
+    ) -> "InputSchema":
+        """Create an input schema with parameters from the response data.
+
+        With a `session`, the schema is flushed for its id and the parameters
+        are inserted with a single executemany, skipping the unit of work:
+        `parameters` is then loaded from the database on first access.
+        """
+        rows = cls.parameter_rows(response_data)
+        if session is None:
+            return cls(
+                collection=collection,
+                parameters=[InputParameter(**row) for row in rows],
             )
+        input_schema = cls(collection=collection)
+        session.add(input_schema)
+        session.flush()
+        if rows:
+            for row in rows:
+                row["input_schema_id"] = input_schema.id
+            session.execute(insert(InputParameter), rows)
+        session.expire(input_schema, ["parameters"])
         return input_schema
 
+    @staticmethod
+    def parameter_rows(response_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Parse the response data into `input_parameter` rows, minus their schema."""
+        inputs = response_data.get("inputs", response_data)
+        return [
+            {
+                "title": input_var.title,
+                "name": input_var.name,
+                "type": input_var.type,
+                "values": list(input_var.values),
+                "choice": input_var.choice,
+            }
+            for input_var in parse_dataset_inputs(inputs)
+        ]
+
 
 class InputParameter(SQLModel, table=True):
     __tablename__ = "input_parameter"
+    __table_args__ = (
+        Index("ix_input_parameter_input_schema_id_name", "input_schema_id", "name"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     input_schema_id: int = Field(
         ..., foreign_key="input_schema.id", description="Input schema identifier"
@@ -440,7 +560,9 @@ class InputParameter(SQLModel, table=True):
     type: ParamType = Field(
         sa_column=Column(Enum(ParamType)), description="Parameter type"
     )
-    values: List[str] = Field(sa_column=Column(JSON), description="Parameter values")
+    values: List[str] = Field(
+        sa_column=Column(string_array_type), description="Parameter values"
+    )
     choice: str = Field(..., description="Choice of the variable")
     is_mandatory: Optional[bool] = Field(
         None, description="Whether the parameter is mandatory"
@@ -448,47 +570,45 @@ class InputParameter(SQLModel, table=True):
     constraints: List["InputParameterConstraint"] = Relationship(
         back_populates="input_parameter"
     )
-    input_schema: Optional["InputSchema"] = Relationship(
-        back_populates="parameters", sa_relationship_kwargs={"lazy": "selectin"}
-    )
+    input_schema: Optional["InputSchema"] = Relationship(back_populates="parameters")
 
 
 class SchemaConstraints(SQLModel, table=True):
     __tablename__ = "schema_constraints"
+    __mapper_args__ = {"eager_defaults": True}
     id: Optional[int] = Field(default=None, primary_key=True)
     input_schema_id: int = Field(
-        ..., foreign_key="input_schema.id", description="Input schema identifier"
+        ...,
+        foreign_key="input_schema.id",
+        description="Input schema identifier",
+        index=True,
     )
     constraints: Dict[str, Any] = Field(
-        sa_column=Column(JSON), description="Constraints JSON data"
-    )
-    created_at: datetime = Field(
-        ..., description="Creation timestamp", default_factory=datetime.now
-    )
-    updated_at: datetime = Field(
-        ..., description="Last update timestamp", default_factory=datetime.now
+        sa_column=Column(json_type), description="Constraints JSON data"
     )
+    created_at: Optional[datetime] = created_at_field()
+    updated_at: Optional[datetime] = updated_at_field()
 
     input_schema: Optional["InputSchema"] = Relationship(
-        back_populates="schema_constraints", sa_relationship_kwargs={"lazy": "selectin"}
+        back_populates="schema_constraints"
     )
 
 
 class InputParameterConstraint(SQLModel, table=True):
     __tablename__ = "input_parameter_constraint"
+    __mapper_args__ = {"eager_defaults": True}
     id: Optional[int] = Field(default=None, primary_key=True)
     input_parameter_id: int = Field(
-        ..., foreign_key="input_parameter.id", description="Input parameter identifier"
+        ...,
+        foreign_key="input_parameter.id",
+        description="Input parameter identifier",
+        index=True,
     )
     constraint: str = Field(..., description="Constraint")
-    created_at: datetime = Field(
-        ..., description="Creation timestamp", default_factory=datetime.now
-    )
-    updated_at: datetime = Field(
-        ..., description="Last update timestamp", default_factory=datetime.now
-    )
+    created_at: Optional[datetime] = created_at_field()
+    updated_at: Optional[datetime] = updated_at_field()
     input_parameter: Optional["InputParameter"] = Relationship(
-        back_populates="constraints", sa_relationship_kwargs={"lazy": "selectin"}
+        back_populates="constraints"
     )
 
 
@@ -504,7 +624,7 @@ __tables__ = [
 ]
 
 
-@dataclass
+@dataclass(slots=True)
 class TableFilter:
     filter_string: str
     table_name: Optional[str] = None
@@ -513,6 +633,37 @@ class TableFilter:
     is_valid: bool = False
 
 
+@lru_cache(maxsize=None)
+def filter_statement(table: "Tables", field: Optional[str]) -> StatementLambdaElement:
+    """
+    Cached statement selecting rows of `table`, filtered on `field` when given.
+
+    The compared value is the `value` bound parameter, so one statement per
+    `(table, field)` is built and compiled per process.
+    """
+    model = table.model
+    statement = lambda_stmt(lambda: select(model))
+    if field:
+        column = getattr(model, field)
+        statement += lambda s: s.where(column == bindparam("value"))
+    return statement
+
+
+@lru_cache(maxsize=None)
+def parent_join_statement(table: "Tables") -> Optional[StatementLambdaElement]:
+    """Cached statement joining the rows of `table` to their immediate parent."""
+    parent: Optional[Tables] = table.immediate_parent
+    if not parent:
+        return None
+    model, parent_model = table.model, parent.model
+    foreign_key = table.parent_identifier
+    return lambda_stmt(
+        lambda: select(model, parent_model).join(
+            parent_model, foreign_key == parent_model.id
+        )
+    )
+
+
 class Tables(enum.Enum):
     collection = "collection"
     catalog_link = "catalog_link"
@@ -528,35 +679,23 @@ class Tables(enum.Enum):
 
     @staticmethod
     def from_name(name: str) -> Optional["Tables"]:
-        return next((table for table in Tables if table.value == name), None)
+        return _TABLE_BY_NAME.get(name)
 
     @property
     def model(self) -> SQLModel:
-        return next(table for table in __tables__ if table.__tablename__ == self.value)
+        return _TABLE_META[self]["model"]
 
     @property
-    def relationship_names(self) -> List[str]:
-        return [str(rel) for rel in self.model.__sqlmodel_relationships__]
+    def relationship_names(self) -> Tuple[str, ...]:
+        return _TABLE_META[self]["relationship_names"]
 
     @property
     def immediate_parent(self) -> Optional["Tables"]:
-        parent_names = self.relationship_names
-        if not parent_names:
-            return None
-        parent = Tables.from_name(parent_names[0])
-        if not parent:
-            return None
-        return parent
+        return _TABLE_META[self]["parent"]
 
     @property
     def parent_foreign_key(self) -> Optional[str]:
-        parent: Optional[Tables] = self.immediate_parent
-        if not parent:
-            return None
-        candidate_column = f"{parent.table_name}_id"
-        if candidate_column in self.fields:
-            return candidate_column
-        return None
+        return _TABLE_META[self]["parent_fk"]
 
     @property
     def parent_identifier(self) -> Optional[int]:
@@ -566,21 +705,16 @@ class Tables(enum.Enum):
         return getattr(self.model, self.parent_foreign_key)
 
     @property
-    def parent_join(self) -> Optional[SelectOfScalar]:
-        parent: Optional[Tables] = self.immediate_parent
-        if not parent:
-            return None
-        return select(self.model, parent.model).join(
-            parent.model, self.parent_identifier == parent.model.id
-        )
+    def parent_join(self) -> Optional[StatementLambdaElement]:
+        return parent_join_statement(self)
 
     @property
     def table_name(self) -> str:
-        return self.model.__tablename__
+        return self.value
 
     @property
-    def fields(self) -> List[str]:
-        return [field for field in self.model.__fields__]
+    def fields(self) -> Tuple[str, ...]:
+        return _TABLE_META[self]["fields"]
 
     def validate_filter_string(self, expression: str) -> TableFilter:
         """Validate a filter string for a table. Filters are of the form `table.field=value`.
@@ -592,23 +726,17 @@ class Tables(enum.Enum):
             A TableFilter object.
         """
         expression = expression.strip()
-        filter = TableFilter(filter_string=expression)
-        if not expression.startswith(self.table_name):
-            return filter
-        allowed_expressions = [f"{self.table_name}.{field}" for field in self.fields]
-        matching_expression = next(
-            (expr for expr in allowed_expressions if expression.startswith(expr)), None
+        meta = _TABLE_META[self]
+        match = meta["filter_re"].fullmatch(expression)
+        if not match or match["field"] not in meta["fields_set"]:
+            return TableFilter(filter_string=expression)
+        return TableFilter(
+            filter_string=expression,
+            table_name=self.table_name,
+            field=match["field"],
+            value=match["value"],
+            is_valid=True,
         )
-        if not matching_expression:
-            return filter
-        remainder = expression[len(matching_expression) :].strip()
-        if not remainder.startswith("="):
-            return filter
-        filter.value = remainder[1:].strip()
-        filter.field = matching_expression.removeprefix(self.table_name + ".").strip()
-        filter.table_name = self.table_name
-        filter.is_valid = True
-        return filter
 
     def apply_filter(self, filter: TableFilter, session: Session) -> List[SQLModel]:
         """Apply a filter to a table. Returns a sequence of SQLModel objects.
@@ -618,34 +746,41 @@ class Tables(enum.Enum):
         """
         if not filter.is_valid:
             return []
-        query = select(self.model)
-        if filter.field:
-            query = query.where(getattr(self.model, filter.field) == filter.value)
-        return list(session.exec(query).fetchall())
+        query = filter_statement(self, filter.field)
+        params = {"value": filter.value} if filter.field else {}
+        return session.scalars(query, params).all()
+
+
+_TABLE_BY_NAME: Dict[str, Tables] = {table.value: table for table in Tables}
 
 
 class Template(SQLModel, table=True):
     __tablename__ = "template"
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (Index("ix_template_name", "name", unique=True),)
     id: Optional[int] = Field(default=None, primary_key=True)
     collection_id: int = Field(
-        ..., foreign_key="collection.id", description="Collection identifier"
+        ...,
+        foreign_key="collection.id",
+        description="Collection identifier",
+        index=True,
     )
     name: str = Field(..., description="Template name")
-    created_at: datetime = Field(
-        ..., description="Creation timestamp", default_factory=datetime.now
-    )
-    updated_at: datetime = Field(
-        ..., description="Last update timestamp", default_factory=datetime.now
-    )
+    created_at: Optional[datetime] = created_at_field()
+    updated_at: Optional[datetime] = updated_at_field()
 
     parameters: List["TemplateParameter"] = Relationship(
         back_populates="template",
-        sa_relationship_kwargs={"lazy": "selectin", "cascade": "merge"},
+        # insertion order, the values are listed as they were given
+        sa_relationship_kwargs={
+            "lazy": "selectin",
+            "cascade": "merge",
+            "order_by": "TemplateParameter.id",
+        },
         cascade_delete=True,
     )
     history: List["TemplateHistory"] = Relationship(
         back_populates="template",
-        sa_relationship_kwargs={"lazy": "selectin"},
         cascade_delete=True,
     )
 
@@ -660,6 +795,15 @@ class Template(SQLModel, table=True):
 
 class TemplateParameter(SQLModel, table=True):
     __tablename__ = "template_parameter"
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        UniqueConstraint(
+            "template_id",
+            "name",
+            "value",
+            name="uq_template_parameter_template_id_name_value",
+        ),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     template_id: int = Field(
         ...,
@@ -669,16 +813,18 @@ class TemplateParameter(SQLModel, table=True):
     )
     name: str = Field(..., description="Parameter name")
     value: str = Field(..., description="Parameter value")
-    created_at: datetime = Field(
-        ..., description="Creation timestamp", default_factory=datetime.now
-    )
-    template: Optional["Template"] = Relationship(
-        back_populates="parameters", sa_relationship_kwargs={"lazy": "selectin"}
-    )
+    created_at: Optional[datetime] = created_at_field()
+    template: Optional["Template"] = Relationship(back_populates="parameters")
 
 
 class TemplateHistory(SQLModel, table=True):
     __tablename__ = "template_history"
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        Index(
+            "ix_template_history_template_id_created_at", "template_id", "created_at"
+        ),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     template_id: int = Field(
         ...,
@@ -686,20 +832,17 @@ class TemplateHistory(SQLModel, table=True):
         description="Template identifier",
         ondelete="CASCADE",
     )
-    data: Dict = Field(default_factory=dict, sa_column=Column(JSON))
-    created_at: datetime = Field(
-        ..., description="Creation timestamp", default_factory=datetime.now
-    )
-    template: Optional["Template"] = Relationship(
-        back_populates="history", sa_relationship_kwargs={"lazy": "selectin"}
-    )
+    data: Dict = Field(default_factory=dict, sa_column=Column(json_type))
+    created_at: Optional[datetime] = created_at_field()
+    template: Optional["Template"] = Relationship(back_populates="history")
     cost_history: Optional["TemplateCostHistory"] = Relationship(
-        back_populates="history", sa_relationship_kwargs={"lazy": "selectin"}
+        back_populates="history"
     )
 
 
 class TemplateCostHistory(SQLModel, table=True):
     __tablename__ = "template_cost_history"
+    __table_args__ = (Index("ix_template_cost_history_history_id", "history_id"),)
     id: Optional[int] = Field(default=None, primary_key=True)
     history_id: int = Field(
         ...,
@@ -713,12 +856,43 @@ class TemplateCostHistory(SQLModel, table=True):
     invalid_reason: Optional[str] = Field(
         None, description="Reason the request is invalid"
     )
-    history: Optional["TemplateHistory"] = Relationship(
-        back_populates="cost_history", sa_relationship_kwargs={"lazy": "selectin"}
-    )
+    history: Optional["TemplateHistory"] = Relationship(back_populates="cost_history")
+
+
+__tables__ += [Template, TemplateParameter, TemplateHistory, TemplateCostHistory]
+
+
+_MODEL_BY_TABLE: Dict[str, SQLModel] = {
+    model.__tablename__: model for model in __tables__
+}
+
+
+def _table_meta(table: Tables) -> Dict[str, Any]:
+    """Describe `table` once, for the `Tables` properties to look up."""
+    model = _MODEL_BY_TABLE[table.value]
+    fields = tuple(model.__fields__)
+    relationship_names = tuple(str(rel) for rel in model.__sqlmodel_relationships__)
+    parent = Tables.from_name(relationship_names[0]) if relationship_names else None
+    parent_fk = f"{parent.value}_id" if parent else None
+    return {
+        "model": model,
+        "fields": fields,
+        "relationship_names": relationship_names,
+        "parent": parent,
+        "parent_fk": parent_fk if parent_fk in fields else None,
+        "fields_set": frozenset(fields),
+        "filter_re": re.compile(
+            rf"{re.escape(table.value)}\.(?P<field>\w+)\s*=\s*(?P<value>.*)", re.DOTALL
+        ),
+    }
+
+
+_TABLE_META: Dict[Tables, Dict[str, Any]] = {
+    table: _table_meta(table) for table in Tables
+}
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class CostEstimate:
     cost: float
     limit: float
@@ -735,7 +909,7 @@ class CostEstimate:
         )
 
     def to_dict(self) -> Dict[str, Any]:
-        return {attr: getattr(self, attr) for attr in self.__dataclass_fields__}
+        return asdict(self)
 
     def to_json(self) -> str:
-        return json.dumps(self.to_dict())
+        return serialization.dumps(self)
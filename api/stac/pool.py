@@ -0,0 +1,81 @@
+"""
+Bounded pool of DuckDB connections for the costings tables.
+
+A single database instance is opened per process, pooled connections are
+duplicates of it: they share the buffer manager and catalog, and each one can
+run its own transaction. Pooled connections are reused, never closed.
+
+Run queries on an acquired connection directly: opening a `.cursor()` per call
+costs a new connection each time, many times slower than the query itself on
+small lookups. Threads needing parallel queries acquire one connection each.
+
+DuckDB only lets several processes open the same file when all of them open it
+read-only: set `STAC_READ_ONLY=true` in query-only workers.
+"""
+
+import os
+import queue
+import threading
+import logging
+from typing import Optional
+
+import duckdb
+
+from storage.datasets import connect_to_database
+
+logger = logging.getLogger(__name__)
+
+pool_size = int(os.getenv("STAC_POOL_SIZE", "4"))
+read_only = os.getenv("STAC_READ_ONLY", "false").lower() == "true"
+# comma separated, e.g. "json,httpfs"
+extensions = [
+    name for name in os.getenv("STAC_DUCKDB_EXTENSIONS", "").split(",") if name
+]
+
+_database: Optional[duckdb.DuckDBPyConnection] = None
+_idle: "queue.Queue[duckdb.DuckDBPyConnection]" = queue.Queue(maxsize=pool_size)
+_created = 0
+_lock = threading.Lock()
+
+
+def _init_database(database: duckdb.DuckDBPyConnection):
+    """Install and load `extensions` once, for every connection of the pool."""
+    for extension in extensions:
+        logger.debug("Loading DuckDB extension %s", extension)
+        database.install_extension(extension)
+        database.load_extension(extension)
+
+
+def _new_connection() -> Optional[duckdb.DuckDBPyConnection]:
+    """Open a connection on the shared database, unless the pool is full."""
+    global _database, _created
+    with _lock:
+        if _created >= pool_size:
+            return None
+        if _database is None:
+            _database = (
+                connect_to_database(read_only=True)
+                if read_only
+                else connect_to_database()
+            )
+            _init_database(_database)
+        _created += 1
+        logger.debug("Opening pooled connection %s/%s", _created, pool_size)
+        return _database.duplicate()
+
+
+def acquire(timeout: Optional[float] = None) -> duckdb.DuckDBPyConnection:
+    """Take an idle connection, open a new one, or wait for one to be released."""
+    try:
+        return _idle.get_nowait()
+    except queue.Empty:
+        pass
+    con = _new_connection()
+    if con is not None:
+        return con
+    return _idle.get(timeout=timeout)
+
+
+def release(con: duckdb.DuckDBPyConnection):
+    """Give a connection back to the pool."""
+    _idle.put_nowait(con)
@@ -0,0 +1,44 @@
+import dataclasses
+import json
+
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional, Union
+
+
+def _default(obj: Any) -> Any:
+    """Encode dataclass instances as objects of their fields."""
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any, indent: Optional[int] = None, sort_keys: bool = False) -> str:
+    """
+    Serialize `obj` to a JSON string, compact unless indented.
+
+    Dataclass instances are encoded as objects of their fields.
+    """
+    separators = None if indent else (",", ":")
+    return json.dumps(
+        obj,
+        indent=indent,
+        sort_keys=sort_keys,
+        separators=separators,
+        default=_default,
+    )
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse a JSON document."""
+    return json.loads(data)
+
+
+def load(path: Path) -> Any:
+    """Parse a JSON file, reading it as raw bytes."""
+    return loads(path.read_bytes())
+
+
+def parse_datetime(value: str) -> datetime:
+    """Parse an ISO 8601 timestamp."""
+    return datetime.fromisoformat(value)
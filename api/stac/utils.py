@@ -70,7 +70,7 @@ def models_to_json(
             return json.dumps(models.model_dump(mode="json", exclude_none=hide_values))
         except Exception as e:
             logger.error(f"Error converting models to JSON: {e}")
-            raise e
+            raise
 
 
 def models_to_table(models: Union[List[SQLModel], SQLModel]) -> Table:
@@ -54,9 +54,9 @@ def new(
     dataset_id: str = typer.Argument(..., help="Dataset ID"),
     template_name: str = typer.Argument(..., help="Template name"),
 ):
-    template_updater = TemplateUpdater(template_name, dataset_id)
-    template_updater.commit()
-    console.print_json(template_updater.to_json())
+    with TemplateUpdater(template_name, dataset_id) as template_updater:
+        template_updater.commit()
+        console.print_json(template_updater.to_json())
 
 
 @app.command(name="+", hidden=True)
@@ -71,16 +71,16 @@ def add(
         None, "--range", "-r", help="Parameter range, format: from-to"
     ),
 ):
-    template_updater = TemplateUpdater(template_name)
-    if parameter_range:
-        from_value, to_value = parameter_range.split("-")
-        template_updater.add_parameter_range(parameter_name, from_value, to_value)
-    elif parameter_value:
-        template_updater.add_parameter(parameter_name, parameter_value)
-    else:
-        raise typer.BadParameter("Either --value or --range must be provided")
-    template_updater.commit()
-    console.print_json(template_updater.to_json())
+    with TemplateUpdater(template_name) as template_updater:
+        if parameter_range:
+            from_value, to_value = parameter_range.split("-")
+            template_updater.add_parameter_range(parameter_name, from_value, to_value)
+        elif parameter_value:
+            template_updater.add_parameter(parameter_name, parameter_value)
+        else:
+            raise typer.BadParameter("Either --value or --range must be provided")
+        template_updater.commit()
+        console.print_json(template_updater.to_json())
 
 
 @app.command(name="mv", hidden=True)
@@ -91,10 +91,10 @@ def update(
     old_value: str = typer.Argument(..., help="Old parameter value"),
     new_value: str = typer.Argument(..., help="New parameter value"),
 ):
-    template_updater = TemplateUpdater(template_name)
-    template_updater.update_parameter_value(parameter_name, old_value, new_value)
-    template_updater.commit()
-    console.print_json(template_updater.to_json())
+    with TemplateUpdater(template_name) as template_updater:
+        template_updater.update_parameter_value(parameter_name, old_value, new_value)
+        template_updater.commit()
+        console.print_json(template_updater.to_json())
 
 
 @app.command(name="-", hidden=True)
@@ -104,10 +104,10 @@ def remove(
     template_name: str = typer.Argument(..., help="Template name"),
     parameter_name: str = typer.Argument(..., help="Parameter name"),
 ):
-    template_updater = TemplateUpdater(template_name)
-    template_updater.remove_parameter(parameter_name)
-    template_updater.commit()
-    console.print_json(template_updater.to_json())
+    with TemplateUpdater(template_name) as template_updater:
+        template_updater.remove_parameter(parameter_name)
+        template_updater.commit()
+        console.print_json(template_updater.to_json())
 
 
 @app.command(name="print", help="Show a template", hidden=True)
@@ -170,9 +170,9 @@ def cost(
         CostMethod.local, "--method", "-m", help="Cost method"
     ),
 ):
-    template_updater = TemplateUpdater(template_name)
-    cost = template_updater.compute_cost(method)
-    console.print_json(cost.to_json())
+    with TemplateUpdater(template_name) as template_updater:
+        cost = template_updater.compute_cost(method)
+        console.print_json(cost.to_json())
 
 
 @app.command(name="trash", help="Remove a template", hidden=True)
@@ -182,8 +182,8 @@ def cost(
 def delete(
     template_name: str = typer.Argument(..., help="Template name"),
 ):
-    template_updater = TemplateUpdater(template_name)
-    template_updater.delete()
+    with TemplateUpdater(template_name) as template_updater:
+        template_updater.delete()
 
 
 @app.command(name="log", help="Show the history of a template", hidden=True)
@@ -196,6 +196,9 @@ def history(
 ):
     template_updater = TemplateUpdater(template_name)
     history = template_updater.fetch_latest_history()
+    if history is None:
+        console.print(f"Template {template_name} has no history")
+        raise typer.Exit(1)
     console.print_json(models_to_json(history))
 
 
@@ -277,10 +280,10 @@ def load(
         ..., "--file", "-f", help="Input file", dir_okay=False
     ),
 ):
-    template_updater = TemplateUpdater.from_json(input_file)
-    if template_name:
-        template_updater.template_name = template_name
-    console.print_json(template_updater.to_json(with_metadata=False))
+    with TemplateUpdater.from_json(input_file) as template_updater:
+        if template_name:
+            template_updater.template_name = template_name
+        console.print_json(template_updater.to_json(with_metadata=False))
 
 
 @app.command(name="optim", help="Optimize a template", hidden=True)
@@ -300,16 +303,16 @@ def optimize(
     budget: float = typer.Option(..., "--budget", "-b", help="Budget"),
     dry_run: bool = typer.Option(False, "--dry-run", "-d", help="Dry run"),
 ):
-    template_updater = TemplateUpdater(template_name)
-    optimizer = TemplateOptimizer(template_updater, budget=budget)
-    optimizer.ensure_budget(name="year")
-    if dry_run:
-        console.print("Dry run, no templates were created")
-        console.print(
-            f"Template {template_name} would have been split into {len(optimizer.valid)} templates"
-        )
-    else:
-        optimizer.persist_templates()
+    with TemplateUpdater(template_name) as template_updater:
+        optimizer = TemplateOptimizer(template_updater, budget=budget)
+        optimizer.ensure_budget(name="year")
+        if dry_run:
+            console.print("Dry run, no templates were created")
+            console.print(
+                f"Template {template_name} would have been split into {len(optimizer.valid)} templates"
+            )
+        else:
+            optimizer.persist_templates()
 
 
 # TODO: doesn't work yet because template required parameters are not checked
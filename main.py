@@ -1,5 +1,6 @@
 import typer
 
+from api.stac.crud import drop_existing, init_db
 from api.stac.commands import app as stac
 from api.templates.commands import app as templates
 
@@ -9,6 +10,13 @@ cli = typer.Typer(
     add_completion=True,
     rich_markup_mode="rich",
 )
+
+
+@cli.callback()
+def startup():
+    init_db(drop_existing=drop_existing)
+
+
 cli.add_typer(stac, name="stac", help="Interact with Copernicus STAC API")
 cli.add_typer(templates, name="template", help="Manage templates (alias: `tpl`)")
 cli.add_typer(templates, name="tpl", help="Manage templates", hidden=True)
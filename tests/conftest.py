@@ -7,8 +7,8 @@ This file ensures critical system checks run before any tests execute.
 import pytest
 import asyncio
 
-from api.stac.crud import is_catalog_loaded
-from api.stac.client import async_stac_client, init_all_collections
+from api.stac.crud import init_db, is_catalog_loaded
+from api.stac.client import init_all_collections
 
 
 def pytest_configure(config):
@@ -26,9 +26,9 @@ def pytest_sessionstart(session):
     requirements are not met.
     """
     try:
+        init_db()
         if not is_catalog_loaded():
-            collections = asyncio.run(init_all_collections())
-            async_stac_client.persist_all(collections)
+            asyncio.run(init_all_collections())
     except Exception:
         pytest.fail(
             "Failed to load STAC catalog and its collections, most tests will fail."
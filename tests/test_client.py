@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from sqlmodel import select
+
+from api.stac.client import async_stac_client
+from api.stac.crud import session_factory
+from api.stac.models import (
+    Collection,
+    InputSchema,
+    Keyword,
+    StacCollection,
+    StacLink,
+)
+
+
+def stac_collection(title: str, keywords: list) -> StacCollection:
+    return StacCollection(
+        id="test-persist-collection",
+        title=title,
+        description="Collection persisted by the tests",
+        created_at=datetime(2020, 1, 1),
+        updated_at=datetime(2020, 1, 2),
+        doi=None,
+        links=[StacLink("license", "https://example.com/license", None, None)],
+        keywords=keywords,
+        retrieve_inputs={
+            "year": {"title": "Year", "schema": {"type": "string", "enum": ["2020"]}}
+        },
+    )
+
+
+def test_persist_all_twice_updates_collection():
+    async_stac_client.persist_all([stac_collection("first", ["a", "b"])])
+    async_stac_client.persist_all([stac_collection("second", ["b", "c"])])
+    with session_factory() as session:
+        collections = session.exec(
+            select(Collection).where(
+                Collection.collection_id == "test-persist-collection"
+            )
+        ).all()
+        assert [collection.title for collection in collections] == ["second"]
+        collection = collections[0]
+        keywords = session.exec(
+            select(Keyword.keyword).where(Keyword.collection_id == collection.id)
+        ).all()
+        assert sorted(keywords) == ["b", "c"]
+        assert len(collection.links) == 1
+        schemas = session.exec(
+            select(InputSchema).where(InputSchema.collection_id == collection.id)
+        ).all()
+        assert len(schemas) == 1
+        assert [parameter.name for parameter in schemas[0].parameters] == ["year"]
@@ -0,0 +1,52 @@
+from math import isfinite
+
+from api.stac.config import config
+from api.stac.crud import (
+    list_non_null_fields,
+    prefix_upper_bound,
+    state_cost_estimate,
+)
+
+
+def test_list_non_null_fields_rows():
+    rows = [
+        {"year": ["2020"], "month": ["01"], "day": ["01"]},
+        {"year": ["2021"], "month": ["02"]},
+        {"year": ["2022"], "month": ["03"], "day": None},
+    ]
+    assert list_non_null_fields(rows) == ["year", "month"]
+
+
+def test_list_non_null_fields_columns():
+    columns = {"year": ["2020", "2021"], "day": ["01", None]}
+    assert list_non_null_fields(columns) == ["year"]
+
+
+def test_list_non_null_fields_empty():
+    assert list_non_null_fields([]) == []
+
+
+def test_prefix_upper_bound():
+    assert prefix_upper_bound("sub_tpl_") == "sub_tpl`"
+    assert "sub_tpl_a" < prefix_upper_bound("sub_tpl_") <= "sub_tplb"
+    assert prefix_upper_bound("a" + chr(0x10FFFF)) == "b"
+    assert prefix_upper_bound("a" + chr(0xD7FF)) == "a" + chr(0xE000)
+    assert prefix_upper_bound("") is None
+
+
+def test_state_cost_estimate():
+    estimate = state_cost_estimate(
+        {"year": ["2020", "2021"], "month": ["01"], "day": "01"}
+    )
+    assert estimate.cost == 2
+    assert estimate.request_is_valid
+
+
+def test_state_cost_estimate_overflow():
+    # 1000 ** 200 overflows a float, the estimate is compared in log space
+    state = {f"param_{i}": [str(v) for v in range(1000)] for i in range(200)}
+    estimate = state_cost_estimate(state)
+    assert not estimate.request_is_valid
+    assert estimate.invalid_reason == "cost overflow"
+    assert isfinite(estimate.cost)
+    assert estimate.limit == config.max_cost_estimate
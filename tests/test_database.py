@@ -0,0 +1,73 @@
+import json
+import queue
+
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+pytest.importorskip("storage.datasets")
+
+from api.stac import database, pool
+from api.stac.models import infer_type
+
+
+@pytest.fixture
+def costings_database(monkeypatch):
+    """Run the pooled connections on a private in-memory database."""
+    monkeypatch.setattr(pool, "_database", duckdb.connect(":memory:"))
+    monkeypatch.setattr(pool, "_idle", queue.Queue(maxsize=pool.pool_size))
+    monkeypatch.setattr(pool, "_created", 0)
+    database.initialize_costings_tables()
+    yield database
+    database._invalidate_tables_cache()
+
+
+def parameter_rows(collection_id: str):
+    with database.get_database_connection() as con:
+        return con.execute(
+            "SELECT parameter_name, title, schema_type, items_type, enum_values"
+            " FROM stac_input_parameters WHERE collection_id = ? ORDER BY id",
+            [collection_id],
+        ).fetchall()
+
+
+def test_store_input_parameters(costings_database):
+    year = infer_type(
+        "year",
+        {
+            "title": "Year",
+            "schema": {"type": "array", "items": {"type": "string", "enum": ["2020"]}},
+        },
+    )
+    data_format = infer_type(
+        "format", {"title": "Format", "schema": {"type": "string", "enum": ["grib"]}}
+    )
+    database.store_input_parameters("ds", [year, data_format])
+    assert parameter_rows("ds") == [
+        ("year", "Year", "array", "string", json.dumps(["2020"])),
+        ("format", "Format", "string", None, json.dumps(["grib"])),
+    ]
+
+
+def test_store_input_parameters_rolls_back(costings_database):
+    data_format = infer_type(
+        "format", {"title": "Format", "schema": {"type": "string", "enum": ["grib"]}}
+    )
+    database.store_input_parameters("ds", [data_format])
+    day = infer_type(
+        "day", {"title": "Day", "schema": {"type": "string", "enum": ["01"]}}
+    )
+    # (collection_id, parameter_name) is unique, the whole batch is rejected
+    with pytest.raises(database.STACDatabaseError):
+        database.store_input_parameters("ds", [day, data_format])
+    assert [row[0] for row in parameter_rows("ds")] == ["format"]
+
+
+def test_initialize_costings_tables_keeps_data(costings_database):
+    data_format = infer_type(
+        "format", {"title": "Format", "schema": {"type": "string", "enum": ["grib"]}}
+    )
+    database.store_input_parameters("ds", [data_format])
+    database.initialize_costings_tables()
+    assert len(parameter_rows("ds")) == 1
+    database.initialize_costings_tables(drop_existing=True)
+    assert parameter_rows("ds") == []
@@ -0,0 +1,25 @@
+import pytest
+
+from api.stac.exceptions import STACAPIError, STACError, STACValidationError
+
+
+def test_errors_without_details_share_a_read_only_mapping():
+    first, second = STACError("first"), STACValidationError("second")
+    assert first.details == {}
+    assert first.details is second.details
+    with pytest.raises(TypeError):
+        first.details["key"] = "value"
+
+
+def test_errors_keep_their_own_details():
+    details = {"field": "year"}
+    error = STACValidationError("invalid", details)
+    assert error.details is details
+    assert STACError("other").details == {}
+
+
+def test_api_error_without_details():
+    error = STACAPIError("failed", status_code=500)
+    assert error.status_code == 500
+    assert error.response_data == {}
+    assert error.details == {}
@@ -0,0 +1,176 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlmodel import Session
+
+from api.stac import crud
+from api.stac.models import Template
+
+# tables as created before the timestamps got their server defaults
+BASELINE_DDL = (
+    """CREATE TABLE collection (
+    id INTEGER NOT NULL,
+    collection_id VARCHAR NOT NULL,
+    title VARCHAR NOT NULL,
+    description VARCHAR NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    doi VARCHAR,
+    PRIMARY KEY (id)
+)""",
+    """CREATE TABLE keyword (
+    id INTEGER NOT NULL,
+    collection_id INTEGER NOT NULL,
+    keyword VARCHAR NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(collection_id) REFERENCES collection (id)
+)""",
+    """CREATE TABLE input_schema (
+    id INTEGER NOT NULL,
+    collection_id INTEGER NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(collection_id) REFERENCES collection (id)
+)""",
+    """CREATE TABLE input_parameter (
+    id INTEGER NOT NULL,
+    input_schema_id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    title VARCHAR NOT NULL,
+    type VARCHAR(7),
+    "values" JSON,
+    choice VARCHAR NOT NULL,
+    is_mandatory BOOLEAN,
+    PRIMARY KEY (id),
+    FOREIGN KEY(input_schema_id) REFERENCES input_schema (id)
+)""",
+    """CREATE TABLE template (
+    id INTEGER NOT NULL,
+    collection_id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(collection_id) REFERENCES collection (id)
+)""",
+    """CREATE TABLE template_parameter (
+    id INTEGER NOT NULL,
+    template_id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    value VARCHAR NOT NULL,
+    created_at DATETIME NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(template_id) REFERENCES template (id) ON DELETE CASCADE
+)""",
+)
+
+
+@pytest.fixture
+def baseline_engine(tmp_path, monkeypatch):
+    """A baseline database, in a time zone where local time is UTC+1."""
+    monkeypatch.setenv("TZ", "UTC-01")
+    time.tzset()
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with engine.begin() as conn:
+        for ddl in BASELINE_DDL:
+            conn.exec_driver_sql(ddl)
+        conn.exec_driver_sql(
+            "INSERT INTO collection VALUES "
+            "(1, 'ds', 't', 'd', '2020-01-01 00:00:00.000000', "
+            "'2020-01-02 00:00:00.000000', NULL)"
+        )
+    monkeypatch.setattr(crud, "engine", engine)
+    monkeypatch.setattr(crud, "sqlite_file_name", str(tmp_path / "baseline.db"))
+    yield engine
+    engine.dispose()
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_migrate_baseline_database(baseline_engine):
+    with baseline_engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO template VALUES "
+            "(1, 1, 'tpl', '2024-05-01 12:00:00.250000', '2024-05-01 12:00:00.250000')"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO template_parameter VALUES "
+            "(1, 1, 'year', '2020', '2024-05-01 12:00:00.250000'), "
+            "(2, 1, 'year', '2020', '2024-05-01 12:00:01.000000')"
+        )
+    crud.init_db()
+    with baseline_engine.begin() as conn:
+        assert (
+            conn.exec_driver_sql("PRAGMA user_version").scalar() == crud.schema_version
+        )
+        # the duplicated value is dropped, local timestamps are converted to UTC
+        assert conn.exec_driver_sql(
+            "SELECT id, created_at FROM template_parameter"
+        ).all() == [(1, "2024-05-01 11:00:00.250000")]
+        # catalog timestamps already are in UTC
+        assert conn.exec_driver_sql("SELECT created_at FROM collection").all() == [
+            ("2020-01-01 00:00:00.000000",)
+        ]
+    with Session(baseline_engine) as session:
+        crud.insert_parameters(
+            session, [{"template_id": 1, "name": "month", "value": "01"}]
+        )
+        session.commit()
+        assert session.get(Template, 1).parameters[-1].created_at is not None
+
+
+def test_migrate_duplicated_collections(baseline_engine):
+    # the catalog used to be persisted again on each `stac init`
+    now = "'2024-05-01 12:00:00.000000'"
+    with baseline_engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO collection SELECT 2, collection_id, title, "
+            "description, created_at, updated_at, doi FROM collection"
+        )
+        for collection_id in (1, 2):
+            conn.exec_driver_sql(
+                f"INSERT INTO keyword VALUES ({collection_id}, {collection_id}, "
+                f"'era5', {now}, {now})"
+            )
+            conn.exec_driver_sql(
+                f"INSERT INTO input_schema VALUES ({collection_id}, {collection_id}, "
+                f"{now}, {now})"
+            )
+            conn.exec_driver_sql(
+                f"INSERT INTO input_parameter VALUES ({collection_id}, "
+                f"{collection_id}, 'year', 'Year', 'string', '[]', 'one', NULL)"
+            )
+        conn.exec_driver_sql(f"INSERT INTO template VALUES (1, 2, 'tpl', {now}, {now})")
+    crud.init_db()
+    with baseline_engine.begin() as conn:
+        for table in ("collection", "keyword", "input_schema", "input_parameter"):
+            assert conn.exec_driver_sql(f"SELECT id FROM {table}").all() == [(1,)]
+        # templates are user data, they are moved to the kept collection
+        assert conn.exec_driver_sql("SELECT collection_id FROM template").all() == [
+            (1,)
+        ]
+
+
+def test_migrate_duplicated_template_names(baseline_engine):
+    now = "'2024-05-01 12:00:00.000000'"
+    with baseline_engine.begin() as conn:
+        for row_id, name in ((1, "tpl"), (2, "tpl"), (3, "tpl_2"), (4, "tpl")):
+            conn.exec_driver_sql(
+                f"INSERT INTO template VALUES ({row_id}, 1, '{name}', {now}, {now})"
+            )
+        conn.exec_driver_sql(
+            f"INSERT INTO template_parameter VALUES (1, 2, 'year', '2020', {now})"
+        )
+    crud.init_db()
+    with baseline_engine.begin() as conn:
+        # no template is lost, nor its parameters
+        assert conn.exec_driver_sql(
+            "SELECT id, name FROM template ORDER BY id"
+        ).all() == [(1, "tpl"), (2, "tpl_2_2"), (3, "tpl_2"), (4, "tpl_4")]
+        assert conn.exec_driver_sql(
+            "SELECT template_id FROM template_parameter"
+        ).all() == [(2,)]
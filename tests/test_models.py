@@ -0,0 +1,76 @@
+from sqlmodel import delete, select
+
+from api.stac.crud import session_factory
+from api.stac.models import Collection, InputSchema, Keyword, Tables
+
+
+def test_validate_filter_string():
+    table_filter = Tables.collection.validate_filter_string(
+        " collection.collection_id = reanalysis-era5 "
+    )
+    assert table_filter.is_valid
+    assert table_filter.table_name == "collection"
+    assert table_filter.field == "collection_id"
+    assert table_filter.value == "reanalysis-era5"
+
+
+def test_validate_filter_string_keeps_value_verbatim():
+    table_filter = Tables.keyword.validate_filter_string("keyword.keyword=a = b")
+    assert table_filter.is_valid
+    assert table_filter.value == "a = b"
+
+
+def test_validate_filter_string_rejects():
+    for expression in (
+        "keyword.collection_id=1",  # another table
+        "collection.unknown=1",  # unknown field
+        "collection.collection_id",  # no value
+        "collectionXcollection_id=1",  # the dot is not a wildcard
+    ):
+        table_filter = Tables.collection.validate_filter_string(expression)
+        assert not table_filter.is_valid, expression
+
+
+def test_keyword_sync():
+    with session_factory() as session:
+        collection = Collection(
+            collection_id="test-keyword-collection", title="t", description="d"
+        )
+        session.add(collection)
+        session.flush()
+        session.add_all(
+            Keyword(collection_id=collection.id, keyword=keyword)
+            for keyword in ("kept", "stale", "kept")
+        )
+        session.flush()
+        kept_ids = session.exec(
+            select(Keyword.id).where(
+                Keyword.collection_id == collection.id, Keyword.keyword == "kept"
+            )
+        ).all()
+
+        Keyword.sync(session, {collection.id: ["kept", "new", "new"]})
+        rows = session.exec(
+            select(Keyword.id, Keyword.keyword)
+            .where(Keyword.collection_id == collection.id)
+            .order_by(Keyword.id)
+        ).all()
+        # the first stored duplicate is kept, the stale and duplicated rows go
+        assert [keyword for _, keyword in rows] == ["kept", "new"]
+        assert rows[0][0] == kept_ids[0]
+
+        session.exec(delete(Keyword).where(Keyword.collection_id == collection.id))
+        session.delete(collection)
+        session.commit()
+
+
+def test_parameter_rows_do_not_share_cached_values():
+    inputs = {
+        "year": {
+            "title": "Year",
+            "schema": {"type": "array", "items": {"type": "string", "enum": ["2020"]}},
+        }
+    }
+    rows = InputSchema.parameter_rows(inputs)
+    rows[0]["values"].append("2021")
+    assert InputSchema.parameter_rows(inputs)[0]["values"] == ["2020"]
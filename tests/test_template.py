@@ -1,8 +1,15 @@
+import json
 import pytest
 
 from pathlib import Path
-
-from api.stac.crud import TemplateUpdater, is_catalog_loaded
+from sqlalchemy.exc import IntegrityError
+
+from api.stac.crud import (
+    TemplateUpdater,
+    insert_parameters,
+    is_catalog_loaded,
+    session_factory,
+)
 from api.stac.optimizer import TemplateOptimizer
 
 test_dir = Path(__file__).parent
@@ -35,6 +42,13 @@ def test_load_json_template(sample_template_updater):
     assert template_updater.cost == 1800
 
 
+def test_parameter_order_round_trip(sample_template_updater):
+    template_updater = sample_template_updater
+    parameters = json.loads(json_path.read_text())["parameters"]
+    assert template_updater.to_dict() == parameters
+    assert TemplateUpdater.from_name("test_template").to_dict() == parameters
+
+
 def test_add_remove_parameter(sample_template_updater):
     template_updater = sample_template_updater
     template_updater.add_parameter("test_parameter", "test_value")
@@ -44,6 +58,17 @@ def test_add_remove_parameter(sample_template_updater):
     assert "test_parameter" not in template_updater.parameter_names
 
 
+def test_failed_write_rolls_back(sample_template_updater):
+    template_updater = sample_template_updater
+    with pytest.raises(IntegrityError):
+        template_updater.add_parameter("test_parameter", None)
+    # the failed transaction must not keep the database locked
+    with TemplateUpdater("test_template") as other_updater:
+        other_updater.add_parameter("test_parameter", "test_value")
+        other_updater.remove_parameter("test_parameter")
+    assert "test_parameter" not in template_updater.parameter_names
+
+
 def test_remove_parameter_values_update_cost(sample_template_updater):
     template_updater = sample_template_updater
     assert template_updater.cost == 1800
@@ -53,6 +78,56 @@ def test_remove_parameter_values_update_cost(sample_template_updater):
     assert template_updater.cost == 1800
 
 
+@pytest.fixture
+def history_template_updater():
+    with TemplateUpdater(
+        "test_history_template", template_updater.dataset_id
+    ) as history_updater:
+        yield history_updater
+        history_updater.delete()
+
+
+def test_history_one_snapshot_per_action(history_template_updater):
+    template_updater = history_template_updater
+    assert template_updater.fetch_latest_history() is None
+    template_updater.add_parameter_range("day", "1", "3")
+    template_updater.add_parameter("year", "2020")
+    template_updater.remove_parameter_value("day", "2")
+    history = template_updater.fetch_history_window(10)
+    # newest first, one snapshot for each action
+    assert [snapshot.data for snapshot in history] == [
+        {"day": ["1", "3"], "year": ["2020"]},
+        {"day": ["1", "2", "3"], "year": ["2020"]},
+        {"day": ["1", "2", "3"]},
+    ]
+    assert [snapshot.data for snapshot in template_updater.fetch_history_window(1)] == [
+        history[0].data
+    ]
+
+
+def test_history_skips_unchanged_state(history_template_updater):
+    template_updater = history_template_updater
+    template_updater.add_parameter("year", "2020")
+    template_updater.add_parameter("year", "2020")
+    assert len(template_updater.fetch_history_window(10)) == 1
+
+
+def test_insert_parameters_skips_duplicates(history_template_updater):
+    template_updater = history_template_updater
+    template_id = template_updater.template.id
+    rows = [
+        {"template_id": template_id, "name": "day", "value": value}
+        for value in ("2", "10", "2", "1")
+    ]
+    with session_factory() as session:
+        insert_parameters(session, rows)
+        insert_parameters(session, rows[:2])
+        session.commit()
+    # duplicates are skipped, the values keep their insertion order
+    with TemplateUpdater(template_updater.template_name) as reloaded:
+        assert reloaded.to_dict() == {"day": ["2", "10", "1"]}
+
+
 def test_template_optimizer(sample_template_updater):
     template_updater = sample_template_updater
     optimizer = TemplateOptimizer(template_updater=template_updater, budget=400)